@@ -0,0 +1,188 @@
+"""
+Offline benchmark suite for the prompt inspector decode paths.
+
+Run from the repo root (the cogs need ./logs to exist):
+    python -m benchmarks [--iterations N] [--sizes 512x512,2048x3072] [--reference] [--output run.json]
+
+Prints a summary table to stderr and the full results as JSON to stdout (or --output), so two
+runs can be diffed directly.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image
+
+from cogs.prompt_inspector import (
+    COG_UID,
+    DecodePool,
+    MetadataCache,
+    get_params_from_string,
+    read_attachment_metadata,
+)
+from owomatic.helpers.pnginfo import read_info_from_image_stealth
+
+from .bench_params import CORPUS
+from .fixtures import SIZES, VARIANTS, make_fixtures, read_info_from_image_stealth_reference
+
+
+class FakeAttachment:
+    """Just enough of disnake.Attachment for read_attachment_metadata without a session."""
+
+    def __init__(self, attachment_id: int, data: bytes):
+        self.id = attachment_id
+        self.filename = f"{attachment_id}.png"
+        self.url = f"https://example.invalid/{attachment_id}.png"
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+
+def summarize(latencies: List[float], nbytes: int = 0) -> dict:
+    lat = np.asarray(latencies)
+    result = {
+        "calls": len(lat),
+        "per_s": len(lat) / lat.sum(),
+        "mean_ms": lat.mean() * 1e3,
+        "p50_ms": np.percentile(lat, 50) * 1e3,
+        "p99_ms": np.percentile(lat, 99) * 1e3,
+    }
+    if nbytes:
+        result["mb_per_s"] = nbytes * len(lat) / lat.sum() / 2**20
+    return result
+
+
+def time_calls(func: Callable, iterations: int) -> List[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_stealth(fixtures: dict, iterations: int, decoder: Callable) -> dict:
+    results = {}
+    for (size, variant), data in fixtures.items():
+        if VARIANTS[variant][0] == "text":
+            continue  # same miss path as "plain" as far as the stealth decoder cares
+
+        def decode():
+            with Image.open(BytesIO(data)) as img:
+                decoder(img)
+
+        results[f"{size[0]}x{size[1]}/{variant}"] = summarize(time_calls(decode, iterations), len(data))
+    return results
+
+
+async def bench_read_attachment(fixtures: dict, iterations: int) -> dict:
+    # one worker, one decode at a time: this measures latency, not pool throughput
+    decoder = DecodePool(max_workers=1, max_concurrent=1)
+    cache = MetadataCache(maxsize=0)
+    results = {}
+    try:
+        await decoder.extract(b"")  # spin the worker up outside the timings
+    except Exception:
+        pass
+    try:
+        next_id = 0
+        for (size, variant), data in fixtures.items():
+            latencies = []
+            for _ in range(iterations):
+                next_id += 1
+                metadata = {}
+                start = time.perf_counter()
+                await read_attachment_metadata(0, FakeAttachment(next_id, data), metadata, decoder, cache)
+                latencies.append(time.perf_counter() - start)
+                if variant != "plain" and 0 not in metadata:
+                    raise RuntimeError(f"No metadata found in {size} {variant} fixture")
+            results[f"{size[0]}x{size[1]}/{variant}"] = summarize(latencies, len(data))
+    finally:
+        decoder.shutdown()
+    return results
+
+
+def bench_params(iterations: int) -> dict:
+    # bypass the lru_cache, we want the parse cost
+    parse = get_params_from_string.__wrapped__
+    latencies = []
+    for _ in range(iterations):
+        latencies += time_calls(lambda: [parse(x) for x in CORPUS], 1)
+    return {"corpus": summarize([x / len(CORPUS) for x in latencies])}
+
+
+def parse_sizes(value: str):
+    return [tuple(int(x) for x in size.split("x")) for size in value.split(",")]
+
+
+def print_table(results: dict) -> None:
+    for bench, cases in results.items():
+        if bench == "meta":
+            continue
+        print(f"\n{bench}", file=sys.stderr)
+        for case, stats in cases.items():
+            mbps = f"{stats['mb_per_s']:9.1f} MB/s" if "mb_per_s" in stats else ""
+            print(
+                f"  {case:28} {stats['per_s']:10.1f}/s  p50 {stats['p50_ms']:9.3f} ms"
+                f"  p99 {stats['p99_ms']:9.3f} ms {mbps}",
+                file=sys.stderr,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="calls per case")
+    parser.add_argument("--sizes", type=parse_sizes, default=SIZES, help="e.g. 512x512,2048x3072")
+    parser.add_argument(
+        "--reference",
+        action="store_true",
+        help="also time the pure-python stealth decoder (smallest size only)",
+    )
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    logging.getLogger(COG_UID).setLevel(logging.WARNING)
+
+    print("Generating fixtures...", file=sys.stderr)
+    fixtures = make_fixtures(args.sizes)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "fixture_bytes": {f"{s[0]}x{s[1]}/{v}": len(d) for (s, v), d in fixtures.items()},
+        },
+        "read_info_from_image_stealth": bench_stealth(
+            fixtures, args.iterations, read_info_from_image_stealth
+        ),
+    }
+    if args.reference:
+        # seconds per call on big images, so only run it on the smallest size
+        smallest = min(args.sizes, key=lambda size: size[0] * size[1])
+        results["read_info_from_image_stealth_reference"] = bench_stealth(
+            {k: v for k, v in fixtures.items() if k[0] == smallest},
+            max(1, args.iterations // 10),
+            read_info_from_image_stealth_reference,
+        )
+    results["read_attachment_metadata"] = asyncio.run(bench_read_attachment(fixtures, args.iterations))
+    results["get_params_from_string"] = bench_params(args.iterations * 50)
+
+    print_table(results)
+    json.dump(results, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
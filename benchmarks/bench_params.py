@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for get_params_from_string, against the split()-based parser it replaced.
+
+Run from the repo root (the cogs need ./logs to exist):
+    python benchmarks/bench_params.py
+"""
+import json
+import sys
+import timeit
+
+from cogs.prompt_inspector import get_params_from_string
+
+# A1111 and ComfyUI (A1111-compatible saver nodes) parameter strings, as found in the wild
+CORPUS = [
+    # plain txt2img
+    "masterpiece, best quality, 1girl, solo, looking at viewer, smile, outdoors, cherry blossoms\n"
+    "Negative prompt: lowres, bad anatomy, bad hands, text, error, missing fingers, worst quality, low quality\n"
+    "Steps: 28, Sampler: DPM++ 2M Karras, CFG scale: 7, Seed: 1234567890, Size: 512x768, "
+    "Model hash: 7f96a1a9ca, Model: anything-v5, Clip skip: 2, ENSD: 31337, Version: v1.6.0",
+    # hires fix, loras with quoted nested key: value lists
+    "a photo of a cat wearing a wizard hat, <lora:add_detail:0.6>, <lora:wizard_hat_v2:0.8>, 8k, detailed fur\n"
+    "Negative prompt: (worst quality:1.4), (low quality:1.4), easynegative\n"
+    "Steps: 30, Sampler: Euler a, CFG scale: 6.5, Seed: 3141592653, Size: 768x512, Model hash: e6bb9ea85b, "
+    "Model: realisticVisionV51, Denoising strength: 0.45, Hires upscale: 2, Hires steps: 15, "
+    'Hires upscaler: 4x-UltraSharp, Lora hashes: "add_detail: 7c6bad76eb54, wizard_hat_v2: 1a2b3c4d5e6f", '
+    'TI hashes: "easynegative: c74b4e810b03", Version: v1.7.0',
+    # controlnet units with long quoted values
+    "portrait of an old fisherman, dramatic lighting, oil painting\n"
+    "Negative prompt: blurry\n"
+    "Steps: 25, Sampler: DPM++ SDE Karras, CFG scale: 5, Seed: 42, Size: 640x896, Model hash: 4199bcdd14, "
+    'Model: revAnimated_v122, ControlNet 0: "Module: openpose_full, Model: control_v11p_sd15_openpose [cab727d4], '
+    "Weight: 1, Resize Mode: Crop and Resize, Low Vram: False, Processor Res: 512, Guidance Start: 0, "
+    'Guidance End: 1, Pixel Perfect: True, Control Mode: Balanced", ControlNet 1: "Module: depth_midas, '
+    'Model: control_v11f1p_sd15_depth [cfd03158], Weight: 0.6, Guidance Start: 0, Guidance End: 0.8", '
+    "Version: v1.6.0",
+    # adetailer + JSON hashes
+    "1boy, armor, castle background\n"
+    "Negative prompt: nsfw, lowres\n"
+    "Steps: 20, Sampler: DPM++ 2M, Schedule type: Karras, CFG scale: 7, Seed: 998877, Size: 832x1216, "
+    "Model hash: 31e35c80fc, Model: sd_xl_base_1.0, ADetailer model: face_yolov8n.pt, ADetailer confidence: 0.3, "
+    'ADetailer prompt: "detailed face, sharp eyes", ADetailer version: 23.11.1, '
+    'Hashes: {"vae": "235745af8d", "model": "31e35c80fc"}, Version: v1.9.4',
+    # ComfyUI image saver style, no negative
+    "a cozy cabin in the snowy woods at night, warm light from the windows, volumetric fog\n"
+    "Steps: 35, Sampler: dpmpp_2m_sde, Scheduler: karras, CFG scale: 4.5, Seed: 615846498521235, Size: 1024x1024, "
+    "Model: juggernautXL_v9, Model hash: c9e3e68f89, Denoising strength: 1.0, Version: ComfyUI",
+    # multiline prompt, empty negative, template line after params
+    "line one of the prompt\nline two, (emphasis:1.2)\n[alternating|words]\n"
+    "Negative prompt: \n"
+    "Steps: 15, Sampler: LCM, CFG scale: 1.5, Seed: 7, Size: 512x512, Model hash: 6ce0161689, "
+    "Model: v1-5-pruned-emaonly, Lora hashes: \"lcm-lora-sdv1-5: 8f90d840e075\", Version: v1.8.0\n"
+    "Template: line one of the prompt",
+]
+
+
+def legacy_get_params_from_string(param_str: str) -> dict:
+    """The old split()-based parser, kept here as the baseline."""
+    output_dict = {}
+    parts = param_str.split("Steps: ")
+    prompts = parts[0]
+    params = "Steps: " + parts[1]
+    if "Negative prompt: " in prompts:
+        output_dict["Prompt"] = prompts.split("Negative prompt: ")[0]
+        output_dict["Negative Prompt"] = prompts.split("Negative prompt: ")[1]
+        if len(output_dict["Negative Prompt"]) > 1000:
+            output_dict["Negative Prompt"] = output_dict["Negative Prompt"][:1000] + "..."
+    else:
+        output_dict["Prompt"] = prompts
+    if len(output_dict["Prompt"]) > 1000:
+        output_dict["Prompt"] = output_dict["Prompt"][:1000] + "..."
+    params = params.split(", ")
+    for param in params:
+        try:
+            key, value = param.split(": ")
+            output_dict[key] = value
+        except ValueError:
+            pass
+    return output_dict
+
+
+def bench_params(number: int = 2000) -> dict:
+    # bypass the lru_cache, we want the parse cost
+    parse = get_params_from_string.__wrapped__
+    results = {}
+    for name, func in [("get_params_from_string", parse), ("legacy", legacy_get_params_from_string)]:
+        best = min(timeit.repeat(lambda: [func(x) for x in CORPUS], number=number, repeat=5))
+        results[name] = {
+            "us_per_call": best / (number * len(CORPUS)) * 1e6,
+            "fields": sum(len(func(x)) for x in CORPUS),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(json.dumps(bench_params(number), indent=2))
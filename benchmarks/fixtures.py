@@ -0,0 +1,196 @@
+"""
+Synthetic PNG fixtures for the prompt inspector benchmarks.
+
+Everything is generated from a fixed seed, so runs on different machines decode the same bytes.
+"""
+import gzip
+from io import BytesIO
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+from owomatic.helpers.pnginfo import decode_stealth_payload
+
+SIZES = [(512, 512), (1024, 1536), (2048, 3072)]
+
+PARAMETERS = (
+    "masterpiece, best quality, a cozy cabin in the snowy woods at night, warm light from the windows\n"
+    "Negative prompt: lowres, bad anatomy, worst quality, low quality\n"
+    "Steps: 28, Sampler: DPM++ 2M Karras, CFG scale: 7, Seed: 1234567890, Size: 512x768, "
+    'Model hash: 7f96a1a9ca, Model: anything-v5, Lora hashes: "add_detail: 7c6bad76eb54", Version: v1.6.0'
+)
+
+STEALTH_SIGNATURES = {
+    ("alpha", False): b"stealth_pnginfo",
+    ("alpha", True): b"stealth_pngcomp",
+    ("rgb", False): b"stealth_rgbinfo",
+    ("rgb", True): b"stealth_rgbcomp",
+}
+
+# variant name -> (where the parameters live, compressed)
+VARIANTS = {
+    "plain": (None, False),
+    "text": ("text", False),
+    "ztxt": ("text", True),
+    "stealth-alpha": ("alpha", False),
+    "stealth-alpha-comp": ("alpha", True),
+    "stealth-rgb": ("rgb", False),
+    "stealth-rgb-comp": ("rgb", True),
+}
+
+
+def make_pixels(size: Tuple[int, int], channels: int, seed: int = 0) -> np.ndarray:
+    """Smooth gradients plus a little noise, so the PNGs compress roughly like real renders."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // max(width - 1, 1), y * 255 // max(height - 1, 1), (x + y) % 256], axis=-1)
+    noise = rng.integers(0, 8, (height, width, 3))
+    pixels = (base + noise).clip(0, 255).astype(np.uint8)
+    if channels == 4:
+        pixels = np.concatenate([pixels, np.full((height, width, 1), 255, dtype=np.uint8)], axis=-1)
+    return pixels
+
+
+def embed_stealth(pixels: np.ndarray, text: str, mode: str, compressed: bool) -> np.ndarray:
+    """Write stealth pnginfo into the LSBs, column by column, the way the webui extension does."""
+    payload = gzip.compress(text.encode("utf-8")) if compressed else text.encode("utf-8")
+    header = STEALTH_SIGNATURES[(mode, compressed)] + (len(payload) * 8).to_bytes(4, "big")
+    bits = np.unpackbits(np.frombuffer(header + payload, dtype=np.uint8))
+
+    columns = pixels.swapaxes(0, 1).copy()
+    plane = columns[..., 3:] if mode == "alpha" else columns[..., :3]
+    flat = plane.reshape(-1)
+    if len(bits) > len(flat):
+        raise ValueError("Image too small for payload")
+    flat[: len(bits)] = (flat[: len(bits)] & 0xFE) | bits
+    if mode == "alpha":
+        columns[..., 3:] = flat.reshape(plane.shape)
+    else:
+        columns[..., :3] = flat.reshape(plane.shape)
+    return columns.swapaxes(0, 1).copy()
+
+
+def make_png(size: Tuple[int, int], variant: str, compress_level: int = 6) -> bytes:
+    location, compressed = VARIANTS[variant]
+    pixels = make_pixels(size, 4 if location == "alpha" else 3)
+    pnginfo = None
+    if location == "text":
+        pnginfo = PngImagePlugin.PngInfo()
+        pnginfo.add_text("parameters", PARAMETERS, zip=compressed)
+    elif location is not None:
+        pixels = embed_stealth(pixels, PARAMETERS, location, compressed)
+
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, format="PNG", pnginfo=pnginfo, compress_level=compress_level)
+    return buf.getvalue()
+
+
+def make_fixtures(sizes=SIZES, variants=VARIANTS) -> Dict[Tuple[Tuple[int, int], str], bytes]:
+    return {(size, variant): make_png(size, variant) for size in sizes for variant in variants}
+
+
+def read_info_from_image_stealth_reference(image: Image.Image):
+    """Original per-pixel stealth pnginfo decoder from the cog, the reference the numpy one is tested against"""
+    # trying to read stealth pnginfo
+    width, height = image.size
+    pixels = image.load()
+
+    has_alpha = True if image.mode == "RGBA" else False
+    mode = None
+    compressed = False
+    binary_data = ""
+    buffer_a = ""
+    buffer_rgb = ""
+    index_a = 0
+    index_rgb = 0
+    sig_confirmed = False
+    confirming_signature = True
+    reading_param_len = False
+    reading_param = False
+    read_end = False
+    for x in range(width):
+        for y in range(height):
+            if has_alpha:
+                r, g, b, a = pixels[x, y]
+                buffer_a += str(a & 1)
+                index_a += 1
+            else:
+                r, g, b = pixels[x, y]
+            buffer_rgb += str(r & 1)
+            buffer_rgb += str(g & 1)
+            buffer_rgb += str(b & 1)
+            index_rgb += 3
+            if confirming_signature:
+                if index_a == len("stealth_pnginfo") * 8:
+                    decoded_sig = bytearray(
+                        int(buffer_a[i : i + 8], 2) for i in range(0, len(buffer_a), 8)
+                    ).decode("utf-8", errors="ignore")
+                    if decoded_sig in {"stealth_pnginfo", "stealth_pngcomp"}:
+                        confirming_signature = False
+                        sig_confirmed = True
+                        reading_param_len = True
+                        mode = "alpha"
+                        if decoded_sig == "stealth_pngcomp":
+                            compressed = True
+                        buffer_a = ""
+                        index_a = 0
+                    else:
+                        read_end = True
+                        break
+                elif index_rgb == len("stealth_pnginfo") * 8:
+                    decoded_sig = bytearray(
+                        int(buffer_rgb[i : i + 8], 2) for i in range(0, len(buffer_rgb), 8)
+                    ).decode("utf-8", errors="ignore")
+                    if decoded_sig in {"stealth_rgbinfo", "stealth_rgbcomp"}:
+                        confirming_signature = False
+                        sig_confirmed = True
+                        reading_param_len = True
+                        mode = "rgb"
+                        if decoded_sig == "stealth_rgbcomp":
+                            compressed = True
+                        buffer_rgb = ""
+                        index_rgb = 0
+            elif reading_param_len:
+                if mode == "alpha":
+                    if index_a == 32:
+                        param_len = int(buffer_a, 2)
+                        reading_param_len = False
+                        reading_param = True
+                        buffer_a = ""
+                        index_a = 0
+                else:
+                    if index_rgb == 33:
+                        pop = buffer_rgb[-1]
+                        buffer_rgb = buffer_rgb[:-1]
+                        param_len = int(buffer_rgb, 2)
+                        reading_param_len = False
+                        reading_param = True
+                        buffer_rgb = pop
+                        index_rgb = 1
+            elif reading_param:
+                if mode == "alpha":
+                    if index_a == param_len:
+                        binary_data = buffer_a
+                        read_end = True
+                        break
+                else:
+                    if index_rgb >= param_len:
+                        diff = param_len - index_rgb
+                        if diff < 0:
+                            buffer_rgb = buffer_rgb[:diff]
+                        binary_data = buffer_rgb
+                        read_end = True
+                        break
+            else:
+                # impossible
+                read_end = True
+                break
+        if read_end:
+            break
+    if sig_confirmed and binary_data != "":
+        # Convert binary string to UTF-8 encoded text
+        byte_data = bytearray(int(binary_data[i : i + 8], 2) for i in range(0, len(binary_data), 8))
+        return decode_stealth_payload(bytes(byte_data), compressed)
+    return None
@@ -1,4 +1,3 @@
-import json
 import logging
 
 import disnake
@@ -7,6 +6,7 @@ from disnake.ext import commands
 
 from owomatic import BLACKLIST_PATH
 from owomatic.helpers import checks, json_manager
+from owomatic.helpers.serialize import read_json
 
 logger = logging.getLogger(__package__)
 
@@ -64,8 +64,7 @@ class Owner(commands.Cog, name="owner"):
         """
         try:
             user_id = user.id
-            with self.blacklist_file.open() as file:
-                blacklist = json.load(file)
+            blacklist = read_json(self.blacklist_file)
             if user_id in blacklist["ids"]:
                 embed = disnake.Embed(
                     title="Error!",
@@ -79,8 +78,7 @@ class Owner(commands.Cog, name="owner"):
                 description=f"**{user.name}** has been successfully added to the blacklist",
                 color=0x9C84EF,
             )
-            with self.blacklist_file.open() as file:
-                blacklist = json.load(file)
+            blacklist = read_json(self.blacklist_file)
             embed.set_footer(text=f"There are now {len(blacklist['ids'])} users in the blacklist")
             await inter.send(embed=embed)
         except Exception as exception:
@@ -119,8 +117,7 @@ class Owner(commands.Cog, name="owner"):
                 description=f"**{user.name}** has been successfully removed from the blacklist",
                 color=0x9C84EF,
             )
-            with self.blacklist_file.open() as file:
-                blacklist = json.load(file)
+            blacklist = read_json(self.blacklist_file)
             embed.set_footer(text=f"There are now {len(blacklist['ids'])} users in the blacklist")
             await inter.send(embed=embed)
         except ValueError:
@@ -1,19 +1,40 @@
-import json
 import logging
 from asyncio import sleep as async_sleep
 from pathlib import Path
 from random import choice, randrange, shuffle
+from typing import Iterable, Optional
 
 from disnake import Message
-from disnake.ext import commands
+from disnake.ext import commands, tasks
 
 from owomatic.bot import Owomatic
-from owomatic.helpers.deowo import deOwOify, realspace
+from owomatic.helpers.ahocorasick import AhoCorasick
+from owomatic.helpers.deowo import deOwOfold, foldsources, foldspace
+from owomatic.helpers.serialize import read_json
 
 COG_UID = "owo"
 
 OWO_JSON = Path(__file__).parent.joinpath("data", "owo.json")
 
+# how often to look for changes to OWO_JSON, config["owo_reload_interval"] overrides, 0 turns it off
+OWO_RELOAD_INTERVAL = 10.0
+
+# skipped between letters by the fuzzy pass: zero-width and invisible formatting characters, plus
+# punctuation people like to sprinkle in. config["owo_filler"] replaces it
+OWO_FILLER = (
+    "\u00ad\u034f\u180e\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff"  # invisible
+    ".,-_*~|'`^"
+)
+
+# channel policies, named after their keys in config["owo_channels"]
+OWO_ALLOWED = "allowed"
+OWO_COOLDOWN = "cooldown"
+
+# youre_dead_kiddo delivery, config["owo_kiddo_mode"]: as few messages as possible, or a line at a time
+KIDDO_PACKED = "packed"
+KIDDO_DRAMATIC = "dramatic"
+MESSAGE_LIMIT = 2000
+
 logger = logging.getLogger(__package__)
 
 NAVY_SEAL = [
@@ -47,46 +68,166 @@ NAVY_UWU = [
 ]
 
 
-class OwoVault:
-    def __init__(self):
-        # load the owo data
-        owodata: dict = json.loads(OWO_JSON.read_text())
+def pack_lines(lines: Iterable[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Join lines into as few newline-separated messages as fit under limit, splitting any that won't fit"""
+    chunks, current = [], ""
+    for line in lines:
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def owo_alphabet(patterns: Iterable[str], filler: str = "") -> Optional[frozenset]:
+    """
+    Characters a message needs at least one of to have any chance of matching one of the patterns.
+
+    A match contains every character of the pattern once folded, so picking one character per
+    pattern (preferring ones already picked) and collecting everything that folds into those gives a
+    set any matching message has to intersect. Returns None if there is no such set.
+
+    Spaces and filler get stripped from the patterns by some passes, so those are only picked when
+    a pattern has nothing else.
+    """
+    alphabet = set()
+    sources = {}
+    skippable = set(filler) | {" "}
+    for pattern in sorted(set(patterns), key=len):
+        if not pattern:
+            return None  # matches everything
+        candidates = set(pattern) - skippable or set(pattern) - {" "} or set(pattern)
+        for char in candidates:
+            if char not in sources:
+                sources[char] = foldsources(char)
+        best = min(candidates, key=lambda x: (len(sources[x] - alphabet), x))
+        alphabet |= sources[best]
+    return frozenset(alphabet)
+
+
+class ShuffleBag:
+    """Hands out every item once, in random order, then refills. Shuffles once per refill."""
+
+    __slots__ = ("items", "_bag", "_last")
+
+    def __init__(self, items: Iterable[str]):
+        self.items: tuple[str, ...] = tuple(items)
+        self._bag: list[str] = []
+        self._last: Optional[str] = None
+
+    def pop(self) -> str:
+        if not self._bag:
+            self._bag = list(self.items)
+            shuffle(self._bag)
+            # don't hand out the same thing twice in a row across a refill
+            if len(self._bag) > 1 and self._bag[-1] == self._last:
+                self._bag[0], self._bag[-1] = self._bag[-1], self._bag[0]
+        self._last = self._bag.pop()
+        return self._last
+
+
+class OwoVocab:
+    """
+    The owo vocabulary and everything compiled from it.
+
+    Never modified once built; reloading builds a new one (off the event loop, if you like) and the
+    vault swaps it in with a single assignment, so check() never sees half of an old one.
+    """
+
+    __slots__ = (
+        "owos",
+        "fwinishews",
+        "filler",
+        "mtime",
+        "matcher",
+        "matcher_nospace",
+        "matcher_unfucked",
+        "alphabet",
+    )
+
+    def __init__(self, owos: list[str], fwinishews: list[str], filler: str = OWO_FILLER, mtime: int = 0):
+        self.owos: tuple[str, ...] = tuple(owos)
+        self.fwinishews: tuple[str, ...] = tuple(fwinishews)
+        self.filler = filler
+        self.mtime = mtime
+
+        # the space-stripped passes skip spaces inside the automaton rather than copying the message.
+        # "ono" is fine with spaces, but "no no" would match it once they're stripped out.
+        # the last pass is the fuzzy one: confusables folded, filler skipped and runs collapsed, so
+        # "o.w\u200bwwo" is an owo. spaces end a run, or "know now" would be one too. still one pass
+        # over the message, whatever's in it
+        self.matcher = AhoCorasick(self.owos)
+        self.matcher_nospace = AhoCorasick((x for x in self.owos if x != "ono"), ignore=" ")
+        self.matcher_unfucked = AhoCorasick(self.owos, ignore=filler, collapse=True, breaks=" ")
+        self.alphabet = owo_alphabet(self.owos, filler)
+
+    @classmethod
+    def from_file(cls, path: Path = OWO_JSON, filler: str = OWO_FILLER) -> "OwoVocab":
+        # stat first, so a write that lands mid-read still shows up as a change next time round
+        mtime = path.stat().st_mtime_ns
+        owodata: dict = read_json(path)
 
-        # make into some props
         owos = owodata.get("owos", [])
         uwus = owodata.get("uwus", [])
-        self.fwinishews = owodata.get("finishers", owos)
+        return cls(owos + uwus, owodata.get("finishers", owos), filler, mtime)
+
+
+class OwoVault:
+    def __init__(self, vocab: Optional[OwoVocab] = None, filler: str = OWO_FILLER):
+        # messages seen by check(), and how many of those the pre-filter threw out
+        self.checked: int = 0
+        self.rejected: int = 0
+        self.swap(vocab if vocab is not None else OwoVocab.from_file(filler=filler))
 
-        self._OwO: list[str] = owos + uwus
-        self._vault = self.OwO
+    def swap(self, vocab: OwoVocab):
+        self._vocab = vocab
+        # one bag per channel, so a busy channel can't drain everyone else's. bags hold the old
+        # vocabulary, so they go too
+        self._bags: dict[Optional[int], ShuffleBag] = {}
 
     @property
-    def OwO(self):
-        return self._OwO.copy()
+    def vocab(self) -> OwoVocab:
+        return self._vocab
 
-    def refresh(self):
-        if len(self._vault) == 0:
-            self._vault = self.OwO
-        shuffle(self._vault)
+    @property
+    def OwO(self):
+        return list(self._vocab.owos)
 
-    def get(self, fwinish_him: bool = False):
+    def get(self, fwinish_him: bool = False, channel_id: Optional[int] = None):
         if fwinish_him:
-            return choice(self.fwinishews)
-        self.refresh()
-        return self._vault.pop()
+            return choice(self._vocab.fwinishews)
+        bag = self._bags.get(channel_id)
+        if bag is None:
+            bag = self._bags[channel_id] = ShuffleBag(self._vocab.owos)
+        return bag.pop()
 
     def check(self, message: Message) -> bool:
-        msg_text = realspace(message.content).lower()
-        msg_unfucked = deOwOify(msg_text)
-        author = f"{message.author.name}#{message.author.discriminator}"
+        vocab = self._vocab
+        self.checked += 1
+        if vocab.alphabet is not None and vocab.alphabet.isdisjoint(message.content):
+            self.rejected += 1
+            return False
+
+        msg_text = foldspace(message.content)
 
         notices = False
-        if any(owo in msg_text for owo in self._OwO):
+        if vocab.matcher.search(msg_text) is not None:
             notices = True
-        elif any(owo in msg_text.replace(" ", "") for owo in self._OwO if owo != "ono"):
+        elif vocab.matcher_nospace.search(msg_text) is not None:
+            author = f"{message.author.name}#{message.author.discriminator}"
             logger.debug(f"non-standard owo detected! {author} thinks they're funny: '{message.content}'")
             notices = True
-        elif any(owo in msg_unfucked.replace(" ", "") for owo in self._OwO):
+        elif vocab.matcher_unfucked.search(deOwOfold(message.content)) is not None:
+            author = f"{message.author.name}#{message.author.discriminator}"
             logger.debug(f"LISTEN HERE YOU LITTLE SHIT. {author} thinks they're funny: '{message.content}'")
             notices = True
         return notices
@@ -96,45 +237,102 @@ class Owo(commands.Cog, name=COG_UID):
     def __init__(self, bot: Owomatic):
         self.bot = bot
         self.vault: OwoVault = None
-        self.owo_allow: list[int] = self.bot.config["owo_channels"]["allowed"]
-        self.owo_maybe: list[int] = self.bot.config["owo_channels"]["cooldown"]
+        # channel id -> policy, channels that aren't in here never get an owo
+        channels = self.bot.config["owo_channels"]
+        self.channel_policy: dict[int, str] = {
+            **dict.fromkeys(channels["cooldown"], OWO_COOLDOWN),
+            **dict.fromkeys(channels["allowed"], OWO_ALLOWED),
+        }
+        self.owners: frozenset[int] = frozenset(self.bot.config["owners"])
+        self._failed_mtime: Optional[int] = None
+        self.kiddo_mode: str = self.bot.config.get("owo_kiddo_mode", KIDDO_PACKED)
+        if self.kiddo_mode not in (KIDDO_PACKED, KIDDO_DRAMATIC):
+            logger.warning(f"Unknown owo_kiddo_mode '{self.kiddo_mode}', using '{KIDDO_PACKED}'")
+            self.kiddo_mode = KIDDO_PACKED
 
     async def cog_load(self) -> None:
         logger.info("OwO what's this?")
-        self.vault = OwoVault()
+        self.vault = OwoVault(filler=self.bot.config.get("owo_filler", OWO_FILLER))
         logger.info(f"{self.vault.get()} is ready to go!!")
+
+        reload_interval = self.bot.config.get("owo_reload_interval", OWO_RELOAD_INTERVAL)
+        if reload_interval > 0:
+            self.reload_task.change_interval(seconds=reload_interval)
+            self.reload_task.start()
         return await super().cog_load()
 
-    async def cog_unload(self) -> None:
+    def cog_unload(self) -> None:
         logger.info("oh nowo? bye bye!")
-        return await super().cog_unload()
+        self.reload_task.cancel()
+        if self.vault is not None:
+            logger.info(
+                f"checked {self.vault.checked} messages, {self.vault.rejected} skipped by the pre-filter"
+            )
+        return super().cog_unload()
+
+    @tasks.loop(seconds=OWO_RELOAD_INTERVAL)
+    async def reload_task(self) -> None:
+        """
+        Watch OWO_JSON for changes, and swap in a freshly built vocabulary when it does.
+        Everything that touches the disk or builds the matchers runs on the bot's executor.
+        """
+        try:
+            mtime = (await self.bot.loop.run_in_executor(self.bot.executor, OWO_JSON.stat)).st_mtime_ns
+        except FileNotFoundError:
+            return  # probably mid-save, try again next time
+        if mtime == self.vault.vocab.mtime or mtime == self._failed_mtime:
+            return
+
+        try:
+            vocab: OwoVocab = await self.bot.do(OwoVocab.from_file, OWO_JSON, self.vault.vocab.filler)
+        except Exception:
+            # keep the old one, and don't try this version of the file again
+            logger.exception(f"Failed to reload {OWO_JSON.name}, keeping the current vocabulary")
+            self._failed_mtime = mtime
+            return
+        self.vault.swap(vocab)
+        logger.info(f"Reloaded {OWO_JSON.name}: {len(vocab.owos)} owos, {len(vocab.fwinishews)} finishers")
 
     async def youre_dead_kiddo(self, message: Message):
-        replied = False
-        async with message.channel.typing():
-            for line in NAVY_UWU:
-                if not replied:
-                    await message.reply(line)
-                    replied = True
-                else:
-                    await message.channel.send(line)
-                await async_sleep(0.2)
+        if self.kiddo_mode == KIDDO_DRAMATIC:
+            # one line at a time, for effect. costs a request per line
+            replied = False
+            async with message.channel.typing():
+                for line in NAVY_UWU:
+                    if not replied:
+                        await message.reply(line)
+                        replied = True
+                    else:
+                        await message.channel.send(line)
+                    await async_sleep(0.2)
+        else:
+            chunks = pack_lines(NAVY_UWU)
+            await message.reply(chunks[0])
+            for chunk in chunks[1:]:
+                await message.channel.send(chunk)
 
     @commands.Cog.listener("on_message")
     async def on_message(self, message: Message):
         if (message.author.bot is True) or (message.author == self.bot.user):
             return
 
-        if message.author.id in self.bot.config["owners"]:
-            if "T_T" in message.content and message.channel.id in self.owo_allow:
+        policy = self.channel_policy.get(message.channel.id)
+        if policy is None:
+            return
+
+        if message.author.id in self.owners:
+            if "T_T" in message.content and policy == OWO_ALLOWED:
                 await message.channel.send("(+_+)")
 
         if message.content.startswith("```"):
             return
+        # roll before looking, most of the time there's no reply to be had anyway
+        if policy == OWO_COOLDOWN and randrange(0, 9) != 7:
+            return
 
         if self.vault.check(message):
             logger.info("owo!")
-            if message.channel.id in self.owo_allow:
+            if policy == OWO_ALLOWED:
                 if randrange(0, 420) == 69 or (
                     "fight me" in message.content.lower()
                     and message.author.id == self.bot.owner_id
@@ -143,13 +341,11 @@ class Owo(commands.Cog, name=COG_UID):
                     logger.info("oh now you've done it, champ")
                     await self.youre_dead_kiddo(message)
                 await self.send_owo(message, fwinish_him=True)
-            elif message.channel.id in self.owo_maybe and randrange(0, 9) == 7:
-                await self.send_owo(message)
             else:
-                logger.info("nowo :(")
+                await self.send_owo(message)
 
     async def send_owo(self, message: Message, fwinish_him: bool = False):
-        await message.channel.send(self.vault.get(fwinish_him))
+        await message.channel.send(self.vault.get(fwinish_him, message.channel.id))
 
 
 def setup(bot):
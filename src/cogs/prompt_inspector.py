@@ -1,15 +1,21 @@
 from functools import lru_cache
-import gzip
+import hashlib
 import json
 import logging
-from asyncio import gather
-from collections import OrderedDict
-from io import BytesIO
-from typing import List, Optional
+import multiprocessing
+import re
+import time
+from asyncio import Semaphore, Task, create_task, gather, get_running_loop
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
 import logsnake
-from async_lru import alru_cache
+from aiohttp import ClientSession
 from disnake import (
+    ApplicationCommandInteraction,
     Attachment,
     ButtonStyle,
     Embed,
@@ -22,15 +28,33 @@ from disnake.ext import commands
 from disnake.ui import Button, View, button
 from owomatic import DATADIR_PATH, LOG_FORMAT, LOGDIR_PATH
 from owomatic.bot import Owomatic
-from PIL import Image
+from owomatic.helpers import checks
+from owomatic.helpers.misc import atomic_write
+from owomatic.helpers.pnginfo import PNG_MAGIC, extract_metadata, png_prefix_status
+from owomatic.helpers.serialize import read_json
 
 COG_UID = "prompt-inspector"
 
 CONFIG_FILE = DATADIR_PATH / f"{COG_UID}.json"
+CACHE_DIR = DATADIR_PATH.joinpath(COG_UID, "cache")
 
 # TRIGGER_EMOJI = "📝"
 TRIGGER_EMOJI = "🔎"
 
+# quoted (e.g. Lora hashes), {...} (e.g. JSON hashes) and [...] values on an A1111 parameters line
+# can contain ", " themselves. where one of those might start:
+PARAM_VALUE_OPEN_RE = re.compile(r': (["\[{])')
+# a quoted value, with backslash escapes
+QUOTED_PARAM_RE = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"', re.DOTALL)
+# and what matters when looking for the end of a bracketed one, which can nest and contain quotes
+BRACKET_RE = re.compile(r"[\[\]{}]")
+BRACKET_TOKEN_RE = re.compile(r'[\[\]{}]|"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# embed fields max out at 1024 characters
+MAX_FIELD_LEN = 1000
+
+# streamed downloads re-check the PNG prefix each time it doubles past this
+FETCH_CHUNK_SIZE = 64 * 2**10
+
 # setup cog logger
 logger = logsnake.setup_logger(
     level=logging.DEBUG,
@@ -74,11 +98,329 @@ class PromptView(View):
             return
 
 
+class DecodePool:
+    """Runs metadata extraction in a dedicated process pool, away from the event loop and the GIL.
+
+    Image bytes go over to a worker once and only the parameter string comes back. At most
+    `max_concurrent` decodes are handed to the pool at a time; the rest wait here so we can
+    see how deep the queue gets during image floods.
+    """
+
+    def __init__(self, max_workers: int = 2, max_concurrent: int = 4):
+        self.max_workers = max_workers
+        self.executor = self._new_executor()
+        self.max_concurrent = max_concurrent
+        self.slots = Semaphore(max_concurrent)
+        self.waiting = 0
+        self.running = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rebuilds = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # forking a process that's already running threads (disnake, the bot executor, logging) can
+        # deadlock a worker, so start them clean. they import owomatic.helpers.pnginfo for
+        # extract_metadata and re-run the main script, so neither may do anything at import time
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    async def extract(self, image_data: bytes) -> Optional[str]:
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        if self.waiting > self.max_concurrent:
+            logger.debug(f"Decode queue backing up: {self.waiting} waiting, {self.running} running")
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        executor = self.executor
+        try:
+            info = await get_running_loop().run_in_executor(executor, extract_metadata, image_data)
+            self.completed += 1
+            return info
+        except BrokenProcessPool:
+            self.failed += 1
+            # a worker died (out of memory on a huge image, most likely) and took the pool with it;
+            # every call in flight lands here, only the first one needs to replace it
+            if executor is self.executor:
+                logger.warning("Decode worker died, starting a new pool")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+                self.rebuilds += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max concurrent": self.max_concurrent,
+            "waiting": self.waiting,
+            "running": self.running,
+            "peak waiting": self.peak_waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pool rebuilds": self.rebuilds,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# sentinel for cache misses, since None is a valid cached result (no metadata)
+MISSING = object()
+
+
+class MetadataCache:
+    """Two-tier cache of extracted parameters, keyed by attachment ID and by image content hash.
+
+    The memory tier is a pair of LRU dicts; the optional disk tier keeps one small file per
+    content hash (empty for images without metadata) plus a pointer file per attachment ID,
+    so reposts and repeated reactions survive a restart without another download. Disk access
+    runs on `executor`, and every `sweep_every` writes the disk tier drops entries older than
+    `disk_ttl` seconds and then the oldest ones past `disk_maxsize` files. Results from partial
+    downloads aren't content-addressed and only ever live in memory.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        cache_dir: Optional[Path] = None,
+        disk_maxsize: int = 65536,
+        disk_ttl: float = 30 * 86400.0,
+        sweep_every: int = 256,
+        executor: Optional[Executor] = None,
+    ):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.disk_maxsize = disk_maxsize
+        self.disk_ttl = disk_ttl
+        self.sweep_every = sweep_every
+        self.executor = executor
+        self._attachments: OrderedDict[int, str] = OrderedDict()
+        self._contents: OrderedDict[str, Optional[str]] = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def digest(image_data: bytes) -> str:
+        return hashlib.blake2b(image_data, digest_size=20).hexdigest()
+
+    @staticmethod
+    def is_partial(digest: str) -> bool:
+        return digest.startswith("partial-")
+
+    def _remember(self, store: OrderedDict, key, value) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.maxsize:
+            store.popitem(last=False)
+
+    async def _lookup(self, store: OrderedDict, key, path: Optional[Path]):
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+        if path is not None:
+            value = await get_running_loop().run_in_executor(self.executor, read_cache_file, path)
+            if value is not None:
+                self._remember(store, key, value)
+                return value
+        return MISSING
+
+    async def get_attachment(self, attachment_id: int) -> Union[Optional[str], object]:
+        """Cached result for an attachment ID. Only counts hits, a miss here goes on to get_content."""
+        ref_path = self.cache_dir.joinpath(f"{attachment_id}.ref") if self.cache_dir else None
+        digest = await self._lookup(self._attachments, attachment_id, ref_path)
+        info = MISSING if digest is MISSING else await self._get_content(digest)
+        if info is not MISSING:
+            self.hits += 1
+        return info
+
+    async def get_content(self, digest: str) -> Union[Optional[str], object]:
+        """Cached result for downloaded image bytes, by digest (or partial-<id> for partial downloads)."""
+        info = await self._get_content(digest)
+        if info is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return info
+
+    async def _get_content(self, digest: str) -> Union[Optional[str], object]:
+        on_disk = self.cache_dir is not None and not self.is_partial(digest)
+        info_path = self.cache_dir.joinpath(f"{digest}.txt") if on_disk else None
+        info = await self._lookup(self._contents, digest, info_path)
+        if info is MISSING:
+            return MISSING
+        # empty files on disk are negative results
+        return info or None
+
+    async def put(self, attachment_id: int, digest: str, info: Optional[str]) -> None:
+        self._remember(self._attachments, attachment_id, digest)
+        self._remember(self._contents, digest, info)
+        if self.cache_dir is None or self.is_partial(digest):
+            return
+        self._writes += 1
+        sweep = self._writes % self.sweep_every == 0
+        try:
+            await get_running_loop().run_in_executor(
+                self.executor, self._write_entry, attachment_id, digest, info, sweep
+            )
+        except OSError as e:
+            logger.warning(f"Failed to write metadata cache entry: {e}")
+
+    def _write_entry(self, attachment_id: int, digest: str, info: Optional[str], sweep: bool) -> None:
+        # an empty file reads back as "no metadata", so a half-written one mustn't ever be visible
+        atomic_write(self.cache_dir.joinpath(f"{digest}.txt"), (info or "").encode("utf-8"))
+        atomic_write(self.cache_dir.joinpath(f"{attachment_id}.ref"), digest.encode("utf-8"))
+        if sweep:
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Trim the disk tier by age and then by count. Blocking, returns how many files went."""
+        entries = []
+        for path in self.cache_dir.iterdir():
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue  # removed under us
+        entries.sort()
+        cutoff = time.time() - self.disk_ttl
+        expired = sum(1 for mtime, _ in entries if mtime < cutoff)
+        excess = max(expired, len(entries) - self.disk_maxsize)
+        for _, path in entries[:excess]:
+            path.unlink(missing_ok=True)
+        if excess:
+            logger.debug(f"Swept {excess} entries from the metadata disk cache")
+        return excess
+
+    def stats(self) -> dict:
+        return {
+            "cache hits": self.hits,
+            "cache misses": self.misses,
+            "cached images": len(self._contents),
+        }
+
+
+def read_cache_file(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+class AttachmentGate:
+    """Decides which attachments are worth downloading, using only what Discord tells us up front.
+
+    Configured from the "gate" section of prompt-inspector.json. Every skipped attachment is
+    counted by reason so we can see what the policy is filtering out.
+    """
+
+    def __init__(self, config: dict):
+        self.content_types = frozenset(config.get("content_types", ["image/png", "image/webp"]))
+        self.extensions = frozenset(x.lower() for x in config.get("extensions", [".png", ".webp"]))
+        self.max_bytes: int = config.get("max_bytes", 32 * 2**20)
+        self.max_pixels: int = config.get("max_pixels", 64 * 2**20)
+        self.max_attachments: int = config.get("max_attachments", 10)
+        self.skipped: Counter = Counter()
+
+    def reject_reason(self, attachment: Attachment) -> Optional[str]:
+        if attachment.content_type is not None:
+            if attachment.content_type.split(";")[0] not in self.content_types:
+                return "content type"
+        elif Path(attachment.filename).suffix.lower() not in self.extensions:
+            return "extension"
+        if attachment.size > self.max_bytes:
+            return "too many bytes"
+        if attachment.width is not None and attachment.height is not None:
+            if attachment.width * attachment.height > self.max_pixels:
+                return "too many pixels"
+        return None
+
+    def filter(self, attachments: List[Attachment]) -> List[Tuple[int, Attachment]]:
+        """(index, attachment) pairs that pass the policy; indices are into the original list."""
+        allowed = []
+        for idx, attachment in enumerate(attachments):
+            reason = self.reject_reason(attachment)
+            if reason is None and len(allowed) >= self.max_attachments:
+                reason = "too many attachments"
+            if reason is not None:
+                self.skipped[reason] += 1
+                logger.debug(f"Skipping attachment {attachment.filename}: {reason}")
+                continue
+            allowed.append((idx, attachment))
+        return allowed
+
+    def stats(self) -> dict:
+        return {f"skipped: {reason}": count for reason, count in self.skipped.most_common()}
+
+
+class ScanStore:
+    """Bounded, TTL'd map of message ID -> scan task.
+
+    Holding the task rather than its result means a reaction that lands while on_message is
+    still scanning just waits for that scan instead of starting another one.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._scans: OrderedDict[int, Tuple[float, Task]] = OrderedDict()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        # entries go in oldest-first and all share one TTL, so expired ones are at the front
+        while self._scans and (len(self._scans) > self.maxsize or next(iter(self._scans.values()))[0] < now):
+            self._scans.popitem(last=False)
+
+    def get(self, message_id: int) -> Optional[Task]:
+        self._expire()
+        entry = self._scans.get(message_id, None)
+        return entry[1] if entry is not None else None
+
+    def put(self, message_id: int, task: Task) -> None:
+        self._scans[message_id] = (time.monotonic() + self.ttl, task)
+        self._scans.move_to_end(message_id)
+        self._expire()
+
+    def discard(self, message_id: int) -> None:
+        self._scans.pop(message_id, None)
+
+
 class PromptInspector(commands.Cog, name=COG_UID):
     def __init__(self, bot):
         self.bot: Owomatic = bot
-        config_dict = json.loads(CONFIG_FILE.read_text())
+        config_dict = read_json(CONFIG_FILE)
         self.channel_ids: List[int] = config_dict.get("channel_ids", [])
+        self.decoder = DecodePool(
+            max_workers=config_dict.get("decode_workers", 2),
+            max_concurrent=config_dict.get("max_concurrent_decodes", 4),
+        )
+        self.cache = MetadataCache(
+            maxsize=config_dict.get("cache_size", 1024),
+            cache_dir=CACHE_DIR if config_dict.get("disk_cache", False) else None,
+            disk_maxsize=config_dict.get("disk_cache_size", 65536),
+            disk_ttl=config_dict.get("disk_cache_ttl", 30 * 86400.0),
+            executor=bot.executor,
+        )
+        self.gate = AttachmentGate(config_dict.get("gate", {}))
+        self.scans = ScanStore(
+            maxsize=config_dict.get("scan_store_size", 2048),
+            ttl=config_dict.get("scan_ttl", 3600.0),
+        )
+
+    def cog_unload(self) -> None:
+        self.decoder.shutdown()
 
     @commands.Cog.listener("on_message")
     async def on_message(self, message: Message):
@@ -87,12 +429,36 @@ class PromptInspector(commands.Cog, name=COG_UID):
             return
         # monitor only channels in the config
         if message.channel.id in self.channel_ids and message.attachments:
-            for i, attachment in enumerate(message.attachments):
-                metadata = OrderedDict()
-                await read_attachment_metadata(i, attachment, metadata)
-                if len(metadata.keys()) > 0:
-                    await message.add_reaction(TRIGGER_EMOJI)
-                    break
+            if any(data is not None for data in (await self.scan_message(message)).values()):
+                await message.add_reaction(TRIGGER_EMOJI)
+
+    async def scan_message(self, message: Message) -> Dict[int, Optional[str]]:
+        """Scan a message's attachments once, returning attachment index -> parameters (or None).
+
+        The result is shared by on_message, the reaction handler and the message command, and
+        negative results are kept too so non-AI images aren't rescanned.
+        """
+        task = self.scans.get(message.id)
+        if task is None:
+            task = create_task(self._scan_message(message))
+            self.scans.put(message.id, task)
+        return await task
+
+    async def _scan_message(self, message: Message) -> Dict[int, Optional[str]]:
+        attachments = self.gate.filter(message.attachments)
+        metadata = OrderedDict()
+        scanned = await gather(
+            *[
+                read_attachment_metadata(
+                    i, attachment, metadata, self.decoder, self.cache, self.bot.http_session
+                )
+                for i, attachment in attachments
+            ]
+        )
+        if not all(scanned):
+            # don't remember a failed download as "no metadata", let the next caller retry
+            self.scans.discard(message.id)
+        return OrderedDict((i, metadata.get(i, None)) for i, _ in attachments)
 
     @commands.Cog.listener("on_raw_reaction_add")
     async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
@@ -110,13 +476,7 @@ class PromptInspector(commands.Cog, name=COG_UID):
             f"Got reaction on message {payload.message_id} with {len(message.attachments)} attachments."
         )
 
-        metadata = OrderedDict()
-        tasks = [
-            read_attachment_metadata(i, attachment, metadata)
-            for i, attachment in enumerate(message.attachments)
-        ]
-        logger.debug(f"Fetching metadata for {len(tasks)} attachments...")
-        tasks = await gather(*tasks)
+        metadata = {i: data for i, data in (await self.scan_message(message)).items() if data is not None}
         if not metadata:
             logger.debug("No metadata found.")
             return
@@ -127,7 +487,7 @@ class PromptInspector(commands.Cog, name=COG_UID):
                 logger.debug(f"Parsing and sending metadata for attachment {attachment.filename}...")
                 embed = dict2embed(get_params_from_string(data), message)
                 embed.set_image(url=attachment.url)
-                view = PromptView(metadata=metadata)
+                view = PromptView(metadata=data)
                 await dm_channel.send(embed=embed, view=view, mention_author=False)
             except ValueError:
                 pass
@@ -138,19 +498,14 @@ class PromptInspector(commands.Cog, name=COG_UID):
         await ctx.response.defer(ephemeral=True)
         message = ctx.target
 
-        attachments = [a for a in message.attachments if a.filename.lower().endswith(".png")]
-        if not attachments:
-            logger.debug(f"No PNG attachments found on message {message.id}")
+        scan = await self.scan_message(message)
+        if not scan:
+            logger.debug(f"No matching attachments found on message {message.id}")
             await ctx.edit_original_response("This post contains no matching images.", ephemeral=True)
             return
-        logger.debug(f"Found {len(attachments)} PNG attachments on message {message.id}")
+        logger.debug(f"Found {len(scan)} matching attachments on message {message.id}")
 
-        metadata = OrderedDict()
-        tasks = [
-            read_attachment_metadata(i, attachment, metadata)
-            for i, attachment in enumerate(message.attachments)
-        ]
-        tasks = await gather(*tasks)
+        metadata = {i: data for i, data in scan.items() if data is not None}
         if not metadata:
             logger.debug(f"No metadata found in attachments for message {message.id}")
             await ctx.edit_original_response(
@@ -165,12 +520,12 @@ class PromptInspector(commands.Cog, name=COG_UID):
 
         dm_channel = await ctx.author.create_dm()
         first = True
-        for attachment, data in [(attachments[i], data) for i, data in metadata.items()]:
+        for attachment, data in [(message.attachments[i], data) for i, data in metadata.items()]:
             try:
                 logger.debug(f"Parsing and sending metadata for attachment {attachment.filename}...")
                 embed = dict2embed(get_params_from_string(data), message)
                 embed.set_image(url=attachment.url)
-                view = PromptView(metadata=metadata)
+                view = PromptView(metadata=data)
                 if first is True:
                     await ctx.edit_original_response(embed=embed, view=view, ephemeral=True)
                     first = False
@@ -178,6 +533,18 @@ class PromptInspector(commands.Cog, name=COG_UID):
             except ValueError:
                 pass
 
+    @commands.slash_command(name="inspector-stats", description="Show prompt inspector decode stats.")
+    @checks.is_owner()
+    async def inspector_stats(self, ctx: ApplicationCommandInteraction):
+        """
+        Show the prompt inspector's decode queue stats.
+        :param ctx: The application command interaction.
+        """
+        embed = Embed(title="Prompt inspector stats", color=0x9C84EF)
+        for key, val in {**self.decoder.stats(), **self.cache.stats(), **self.gate.stats()}.items():
+            embed.add_field(name=key, value=f"`{val}`", inline=True)
+        await ctx.send(embed=embed, ephemeral=True)
+
 
 def dict2embed(data: dict, context: Message) -> Embed:
     embed = Embed(color=context.author.color)
@@ -187,159 +554,184 @@ def dict2embed(data: dict, context: Message) -> Embed:
     return embed
 
 
-def read_info_from_image_stealth(image: Image.Image):
-    # trying to read stealth pnginfo
-    width, height = image.size
-    pixels = image.load()
-
-    has_alpha = True if image.mode == "RGBA" else False
-    mode = None
-    compressed = False
-    binary_data = ""
-    buffer_a = ""
-    buffer_rgb = ""
-    index_a = 0
-    index_rgb = 0
-    sig_confirmed = False
-    confirming_signature = True
-    reading_param_len = False
-    reading_param = False
-    read_end = False
-    for x in range(width):
-        for y in range(height):
-            if has_alpha:
-                r, g, b, a = pixels[x, y]
-                buffer_a += str(a & 1)
-                index_a += 1
-            else:
-                r, g, b = pixels[x, y]
-            buffer_rgb += str(r & 1)
-            buffer_rgb += str(g & 1)
-            buffer_rgb += str(b & 1)
-            index_rgb += 3
-            if confirming_signature:
-                if index_a == len("stealth_pnginfo") * 8:
-                    decoded_sig = bytearray(
-                        int(buffer_a[i : i + 8], 2) for i in range(0, len(buffer_a), 8)
-                    ).decode("utf-8", errors="ignore")
-                    if decoded_sig in {"stealth_pnginfo", "stealth_pngcomp"}:
-                        confirming_signature = False
-                        sig_confirmed = True
-                        reading_param_len = True
-                        mode = "alpha"
-                        if decoded_sig == "stealth_pngcomp":
-                            compressed = True
-                        buffer_a = ""
-                        index_a = 0
-                    else:
-                        read_end = True
-                        break
-                elif index_rgb == len("stealth_pnginfo") * 8:
-                    decoded_sig = bytearray(
-                        int(buffer_rgb[i : i + 8], 2) for i in range(0, len(buffer_rgb), 8)
-                    ).decode("utf-8", errors="ignore")
-                    if decoded_sig in {"stealth_rgbinfo", "stealth_rgbcomp"}:
-                        confirming_signature = False
-                        sig_confirmed = True
-                        reading_param_len = True
-                        mode = "rgb"
-                        if decoded_sig == "stealth_rgbcomp":
-                            compressed = True
-                        buffer_rgb = ""
-                        index_rgb = 0
-            elif reading_param_len:
-                if mode == "alpha":
-                    if index_a == 32:
-                        param_len = int(buffer_a, 2)
-                        reading_param_len = False
-                        reading_param = True
-                        buffer_a = ""
-                        index_a = 0
-                else:
-                    if index_rgb == 33:
-                        pop = buffer_rgb[-1]
-                        buffer_rgb = buffer_rgb[:-1]
-                        param_len = int(buffer_rgb, 2)
-                        reading_param_len = False
-                        reading_param = True
-                        buffer_rgb = pop
-                        index_rgb = 1
-            elif reading_param:
-                if mode == "alpha":
-                    if index_a == param_len:
-                        binary_data = buffer_a
-                        read_end = True
-                        break
-                else:
-                    if index_rgb >= param_len:
-                        diff = param_len - index_rgb
-                        if diff < 0:
-                            buffer_rgb = buffer_rgb[:diff]
-                        binary_data = buffer_rgb
-                        read_end = True
-                        break
-            else:
-                # impossible
-                read_end = True
-                break
-        if read_end:
-            break
-    if sig_confirmed and binary_data != "":
-        # Convert binary string to UTF-8 encoded text
-        byte_data = bytearray(int(binary_data[i : i + 8], 2) for i in range(0, len(binary_data), 8))
-        try:
-            if compressed:
-                decoded_data = gzip.decompress(bytes(byte_data)).decode("utf-8")
-            else:
-                decoded_data = byte_data.decode("utf-8", errors="ignore")
-            return decoded_data
-        except Exception as e:
-            logger.exception(e)
-            pass
-    return None
+def truncate_field(value: str) -> str:
+    return value[:MAX_FIELD_LEN] + "..." if len(value) > MAX_FIELD_LEN else value
 
 
 @lru_cache(maxsize=128)
 def get_params_from_string(param_str: str) -> dict:
-    logger.debug(f"Parsing parameters from string: {param_str}")
-    output_dict = {}
-    parts = param_str.split("Steps: ")
-    prompts = parts[0]
-    params = "Steps: " + parts[1]
-    if "Negative prompt: " in prompts:
-        output_dict["Prompt"] = prompts.split("Negative prompt: ")[0]
-        output_dict["Negative Prompt"] = prompts.split("Negative prompt: ")[1]
-        if len(output_dict["Negative Prompt"]) > 1000:
-            output_dict["Negative Prompt"] = output_dict["Negative Prompt"][:1000] + "..."
+    """Parse an A1111-style parameters string into an ordered dict of display fields.
+
+    The prompt and negative prompt are split off the front, then the `Steps: ...` line is split
+    on ", " in one go, keeping quoted, {...} and [...] values that contain ", " in one piece.
+    """
+    start = param_str.rfind("\nSteps: ") + 1
+    if start == 0 and not param_str.startswith("Steps: "):
+        start = param_str.find("Steps: ")
+    if start == -1:
+        return {"Prompt": truncate_field(param_str.strip())}
+
+    negative = param_str.find("Negative prompt: ", 0, start)
+    if negative == -1:
+        output_dict = {"Prompt": param_str[:start].strip()}
     else:
-        output_dict["Prompt"] = prompts
-    if len(output_dict["Prompt"]) > 1000:
-        output_dict["Prompt"] = output_dict["Prompt"][:1000] + "..."
-    params = params.split(", ")
-    for param in params:
-        try:
-            key, value = param.split(": ")
-            output_dict[key] = value
-        except ValueError:
-            pass
-    logger.debug(f"got {len(output_dict.keys())} params, returning...")
+        output_dict = {
+            "Prompt": param_str[:negative].strip(),
+            "Negative Prompt": param_str[negative + len("Negative prompt: ") : start].strip(),
+        }
+
+    params = param_str[start:]
+    if "\n" in params:
+        params = params.replace("\n", ", ")
+    if '"' in params or "{" in params or "[" in params:
+        split_params(params, output_dict)
+    else:
+        split_plain_params(params, output_dict)
+
+    if len(param_str) > MAX_FIELD_LEN:
+        return {key: truncate_field(value) for key, value in output_dict.items()}
     return output_dict
 
 
-@alru_cache(maxsize=128)
-async def read_attachment_metadata(idx: int, attachment: Attachment, metadata: OrderedDict):
-    """Allows downloading in bulk"""
+def split_params(params: str, fields: dict) -> None:
+    """Split a `Steps: ...` line with quoted or {...}/[...] values (which can contain ", ") in it.
+
+    Each value that opens with a quote or bracket is read up to its closing one, and the plain
+    parts in between go through the usual ", " split. Text between the closing quote or bracket
+    and the next ", " is dropped, and a value that never closes is taken as plain text, like the
+    legacy parser.
+    """
+    pos, end = 0, len(params)
+    for opening in PARAM_VALUE_OPEN_RE.finditer(params):
+        colon = opening.start()
+        if colon < pos:
+            continue  # inside the last value
+        comma = params.rfind(", ", pos, colon)
+        part_start = pos if comma == -1 else comma + 2
+        if params.find(": ", part_start, colon) != -1:
+            continue  # not where this part's value starts
+        if part_start > pos:
+            split_plain_params(params[pos : part_start - 2], fields)
+        start = colon + 2
+        value_end = -1
+        if opening.group(1) == '"':
+            match = QUOTED_PARAM_RE.match(params, start)
+            if match is not None:
+                value, value_end = match.group(1), match.end()
+                if "\\" in value:
+                    value = unescape_param(value)
+        else:
+            value_end = find_closing_bracket(params, start)
+            value = params[start:value_end]  # replaced below if it's never closed
+        part_end = params.find(", ", start if value_end == -1 else value_end)
+        if part_end == -1:
+            part_end = end
+        if value_end == -1:
+            value = params[start:part_end]
+        fields[params[part_start:colon]] = value
+        pos = part_end + 2
+    if pos < end:
+        split_plain_params(params[pos:], fields)
+
+
+def find_closing_bracket(params: str, start: int) -> int:
+    """Index just past the bracket closing the one at `start`, or -1 if it's never closed."""
+    # the usual case, nothing nested and no quoted brackets: the next bracket closes it
+    bracket = BRACKET_RE.search(params, start + 1)
+    if bracket is not None and bracket.group() in "]}":
+        inner = params[start + 1 : bracket.start()]
+        if "\\" not in inner and not inner.count('"') % 2:
+            return bracket.end()
+    depth = 0
+    for match in BRACKET_TOKEN_RE.finditer(params, start):
+        token = match.group()
+        if token == "[" or token == "{":
+            depth += 1
+        elif token == "]" or token == "}":
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return -1
+
+
+def split_plain_params(params: str, fields: dict) -> None:
+    for part in params.split(", "):
+        key, sep, value = part.partition(": ")
+        if sep:
+            fields[key] = value
+
+
+def unescape_param(value: str) -> str:
     try:
-        image_data = await attachment.read()
-        with Image.open(BytesIO(image_data)) as img:
-            try:
-                info = img.info["parameters"]
-            except Exception:
-                info = read_info_from_image_stealth(img)
-            if info and "Steps" in info:
-                metadata[idx] = info
+        return json.loads(f'"{value}"', strict=False)
+    except ValueError:
+        return value
+
+
+async def fetch_attachment(session: ClientSession, url: str) -> Tuple[bytes, bool]:
+    """Stream an attachment, stopping as soon as what we have is enough to answer from.
+
+    PNG text chunks sit before the pixel data, so most of the time the first chunk or two of
+    the download is all we need. Returns the bytes read and whether that's the whole file.
+    """
+    data = bytearray()
+    next_check = FETCH_CHUNK_SIZE
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.content.iter_chunked(FETCH_CHUNK_SIZE):
+            data += chunk
+            if next_check is None or len(data) < next_check:
+                continue
+            # check at doubling sizes so the re-parsing stays linear in the download size
+            next_check = len(data) * 2
+            status = png_prefix_status(bytes(data)) if data.startswith(PNG_MAGIC) else True
+            if status is False:
+                if resp.content.is_eof():
+                    # the rest has already arrived, so keep it and let the file be hashed whole
+                    data += await resp.content.read()
+                    break
+                resp.close()
+                return bytes(data), False
+            if status is True:
+                # need the whole thing for a stealth decode (or it isn't a PNG)
+                next_check = None
+    return bytes(data), True
+
+
+async def read_attachment_metadata(
+    idx: int,
+    attachment: Attachment,
+    metadata: OrderedDict,
+    decoder: DecodePool,
+    cache: MetadataCache,
+    session: Optional[ClientSession] = None,
+):
+    """Allows downloading in bulk. Returns False if the attachment couldn't be read."""
+    try:
+        info = await cache.get_attachment(attachment.id)
+        if info is MISSING:
+            if session is not None:
+                image_data, complete = await fetch_attachment(session, attachment.url)
+            else:
+                image_data, complete = await attachment.read(), True
+            # a partial download can't be content-addressed, so only cache it by attachment
+            digest = MetadataCache.digest(image_data) if complete else f"partial-{attachment.id}"
+            info = await cache.get_content(digest)
+            if info is MISSING:
+                try:
+                    info = await decoder.extract(image_data)
+                except Exception as e:
+                    # extract_metadata copes with bad images itself, so this is the pool failing and
+                    # says nothing about the image; don't cache it as having no metadata
+                    logger.warning(f"Failed to decode {attachment.filename}: {type(e).__name__}: {e}")
+                    return False
+            await cache.put(attachment.id, digest, info)
+        if info is not None:
+            metadata[idx] = info
+        return True
     except Exception as e:
         logger.error(f"{type(e).__name__}: {e}")
+        return False
 
 
 def setup(bot):
@@ -22,4 +22,7 @@ MISCDATA_PATH = DATADIR_PATH.joinpath("misc")
 
 CONFIG_PATH = DATADIR_PATH.joinpath("config.json")
 USERDATA_PATH = DATADIR_PATH.joinpath("userdata.json")
+USERDATA_JOURNAL_PATH = DATADIR_PATH.joinpath("userdata.journal")
+USERDATA_SHARDS_PATH = DATADIR_PATH.joinpath("userdata")
+USERDATA_DB_PATH = DATADIR_PATH.joinpath("userdata.sqlite3")
 BLACKLIST_PATH = DATADIR_PATH.joinpath("blacklist.json")
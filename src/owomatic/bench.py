@@ -0,0 +1,336 @@
+"""
+Offline benchmarks, run with `owomatic bench <name>`. Nothing here needs a bot token or a network.
+"""
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+
+import click
+
+# the sort of thing people actually say in a discord server, owo-bait included
+CHAT = [
+    "lol",
+    "yeah",
+    "gm",
+    "anyone up for some games tonight?",
+    "brb getting food",
+    "no no no that's not how that works",
+    "has anyone tried the new update yet? the patch notes look kinda wild",
+    "owo what's this",
+    "OwO",
+    "uwu",
+    "that's so cute uwu",
+    "o w o",
+    "u w u",
+    "ｏｗｏ",
+    "𝐨𝐰𝐨 notices your bulge",
+    "(◕‿◕✿)",
+    "i can't believe it's already friday, this week went by so fast",
+    "ok but hear me out: pineapple on pizza is actually good",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "<@123456789012345678> did you see this?",
+    "ngl that render looks sick, what settings did you use?",
+    "the server was down for like an hour earlier, was it just me?",
+    "ono",
+    "I think the owner of the bot needs to update the owo list",
+    "can someone help me with my python code? it keeps throwing a KeyError on line 42",
+    "```py\nprint('hello world')\n```",
+    "new phone who dis",
+    "it's 3am why am i still awake",
+    "wow, wow, wow",
+    "we're going to the zoo tomorrow, anyone want to come?",
+]
+
+FILLER = (
+    "the a to and of it is that for on you this with was but not are have be at just so what like can "
+    "do if about get one out all your now up there how when think know really good new time going well "
+    "people make want would some then could more been back over here work game today night server bot"
+).split()
+
+
+def make_corpus(count: int, seed: int = 0) -> List[str]:
+    """Mix of the chat lines above and longer filler messages, mostly with no owo in them at all."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            corpus.append(rng.choice(CHAT))
+        else:
+            corpus.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(5, 120))))
+    return corpus
+
+
+def load_corpus(path: Path) -> List[str]:
+    """
+    Recorded messages, either one JSON object per line with a "content" key (what a channel export
+    gives you) or, failing that, one message per line of plain text.
+    """
+    corpus = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            corpus.append(json.loads(line)["content"])
+        except (ValueError, KeyError, TypeError):
+            corpus.append(line)
+    return corpus
+
+
+def fake_message(content: str):
+    """Just enough of disnake.Message for OwoVault.check()"""
+    return SimpleNamespace(content=content, author=SimpleNamespace(name="bench", discriminator="0000"))
+
+
+def summarize(latencies: List[float]) -> dict:
+    lat = sorted(latencies)
+    total = sum(lat)
+    return {
+        "calls": len(lat),
+        "per_s": len(lat) / total if total else float("inf"),
+        "mean_us": total / len(lat) * 1e6,
+        "p50_us": lat[len(lat) // 2] * 1e6,
+        "p99_us": lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e6,
+        "max_us": lat[-1] * 1e6,
+    }
+
+
+def time_each(func: Callable, items: list) -> List[float]:
+    latencies = []
+    clock = time.perf_counter
+    for item in items:
+        start = clock()
+        func(item)
+        latencies.append(clock() - start)
+    return latencies
+
+
+def measure_allocations(func: Callable, items: list) -> dict:
+    """Peak memory allocated while handling each item, which is mostly the string copies it made."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for item in items:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(item)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    chars = sum(len(getattr(x, "content", x)) for x in items)
+    return {
+        "peak_bytes_per_msg": sum(peaks) / len(peaks),
+        "peak_bytes_per_char": sum(peaks) / max(chars, 1),
+        "p99_peak_bytes": sorted(peaks)[min(len(peaks) - 1, int(len(peaks) * 0.99))],
+    }
+
+
+def legacy_check(owos: List[str], confusables: dict, blanks: dict, content: str) -> bool:
+    """The substring-loop OwoVault.check that the automaton replaced, kept as the baseline."""
+    msg_text = content.translate(blanks).lower()
+    msg_unfucked = msg_text.translate(confusables)
+    if any(owo in msg_text for owo in owos):
+        return True
+    elif any(owo in msg_text.replace(" ", "") for owo in owos if owo != "ono"):
+        return True
+    elif any(owo in msg_unfucked.replace(" ", "") for owo in owos):
+        return True
+    return False
+
+
+def bench_owo(corpus: List[str], repeat: int = 3) -> dict:
+    from cogs.owo import OwoVault
+    from owomatic.helpers.deowo import blanksdict, deOwOfold, deOwOify, foldspace, owodict, realspace
+
+    vault = OwoVault()
+    messages = [fake_message(x) for x in corpus]
+    # the baseline gets the hand-picked tables it shipped with, not the generated owofold one
+    legacy = partial(legacy_check, list(vault.vocab.owos), str.maketrans(owodict), str.maketrans(blanksdict))
+    for message in messages[:1000]:
+        vault.check(message)  # warm up
+    vault.checked = vault.rejected = 0
+
+    results = {}
+    cases = [
+        ("OwoVault.check", vault.check, messages),
+        ("legacy check", legacy, corpus),
+        ("foldspace", foldspace, corpus),
+        ("deOwOfold", deOwOfold, corpus),
+        ("realspace", realspace, corpus),
+        ("deOwOify", deOwOify, corpus),
+    ]
+    for name, func, items in cases:
+        # best of N by total time, so one noisy pass doesn't skew the whole thing
+        runs = [time_each(func, items) for _ in range(repeat)]
+        results[name] = summarize(min(runs, key=sum))
+        results[name].update(measure_allocations(func, items))
+
+    matches = sum(vault.check(x) for x in messages)
+    results["OwoVault.check"].update(
+        {
+            "matched": matches / len(messages),
+            "prefilter_rejected": vault.rejected / vault.checked,
+            "vocabulary": len(vault.vocab.owos),
+        }
+    )
+    results["legacy check"]["matched"] = sum(legacy(x) for x in corpus) / len(corpus)
+    return results
+
+
+def make_userdata(users: int, seed: int = 0) -> dict:
+    """A userdata.json-shaped dict: most users with a handful of notes, some with a lot of them."""
+    rng = random.Random(seed)
+    userdata = {}
+    for _ in range(users):
+        user_id = rng.randrange(10**17, 10**18)  # snowflake-sized
+        notes = {}
+        for i in range(int(rng.paretovariate(1.5))):
+            words = rng.randint(3, 300)
+            notes[f"{rng.choice(FILLER)}-{i}"] = " ".join(rng.choice(FILLER) for _ in range(words))
+        userdata[str(user_id)] = {"notes": notes, "owo_count": rng.randint(0, 500), "last_seen": time.time()}
+    return {"version": 1, "users": userdata}
+
+
+def best_of(func: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_serialize(userdata: dict, repeat: int = 5) -> dict:
+    from owomatic.helpers.serialize import BACKENDS
+
+    # what the bot did before owomatic.helpers.serialize, as the baseline
+    cases = {
+        "stdlib-legacy": (
+            lambda obj, pretty: json.dumps(obj, skipkeys=True, indent=2 if pretty else None).encode(),
+            json.loads,
+        ),
+        **BACKENDS,
+    }
+    results = {}
+    for name, (dumps, loads) in cases.items():
+        for pretty in (False, True):
+            encoded = dumps(userdata, pretty)
+            mbytes = len(encoded) / 2**20
+            encode = best_of(lambda: dumps(userdata, pretty), repeat)
+            decode = best_of(lambda: loads(encoded), repeat)
+            results[f"{name}{'-pretty' if pretty else ''}"] = {
+                "size_mb": mbytes,
+                "encode_ms": encode * 1e3,
+                "decode_ms": decode * 1e3,
+                "encode_mb_s": mbytes / encode,
+                "decode_mb_s": mbytes / decode,
+            }
+    return results
+
+
+def print_table(results: dict) -> None:
+    for name, stats in results.items():
+        click.echo(
+            f"  {name:16} {stats['per_s']:12.0f} msg/s  p50 {stats['p50_us']:8.2f} us"
+            f"  p99 {stats['p99_us']:8.2f} us  {stats['peak_bytes_per_msg']:9.1f} B/msg",
+            err=True,
+        )
+
+
+@click.group()
+def bench():
+    """Offline benchmarks for the bot's hot paths."""
+    pass
+
+
+@bench.command("owo")
+@click.option("-n", "--messages", type=int, default=50000, help="Synthetic messages to generate.")
+@click.option(
+    "-c",
+    "--corpus",
+    "corpus_paths",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    multiple=True,
+    help="Recorded messages (JSON lines with 'content', or plain text lines). Repeatable.",
+)
+@click.option("--seed", type=int, default=0, help="Seed for the synthetic corpus.")
+@click.option("--repeat", type=int, default=3, help="Timing passes per case, the fastest is kept.")
+@click.option("-o", "--output", type=click.File("w"), default="-", help="Where to write the JSON results.")
+def bench_owo_command(messages: int, corpus_paths: tuple, seed: int, repeat: int, output):
+    """Throughput, p99 latency and allocations of the owo detector."""
+    logging.getLogger("cogs").setLevel(logging.INFO)  # check() debug-logs every near miss
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        }
+    }
+    corpora = {"synthetic": make_corpus(messages, seed)} if messages > 0 else {}
+    for path in corpus_paths:
+        corpora[path.name] = load_corpus(path)
+
+    for name, corpus in corpora.items():
+        if not corpus:
+            raise click.ClickException(f"Corpus '{name}' is empty")
+        click.echo(f"{name}: {len(corpus)} messages", err=True)
+        results[name] = bench_owo(corpus, repeat)
+        print_table(results[name])
+
+    json.dump(results, output, indent=2)
+    output.write("\n")
+
+
+@bench.command("userdata")
+@click.option("-u", "--users", type=int, default=50000, help="Users in the synthetic userdata.")
+@click.option(
+    "-f",
+    "--file",
+    "userdata_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Benchmark a real userdata.json instead.",
+)
+@click.option("--seed", type=int, default=0, help="Seed for the synthetic userdata.")
+@click.option("--repeat", type=int, default=5, help="Timing passes per case, the fastest is kept.")
+@click.option("-o", "--output", type=click.File("w"), default="-", help="Where to write the JSON results.")
+def bench_userdata_command(users: int, userdata_path: Optional[Path], seed: int, repeat: int, output):
+    """Encode/decode times of each JSON backend on a large userdata file."""
+    from owomatic.helpers.serialize import BACKEND
+
+    if userdata_path is not None:
+        userdata = json.loads(userdata_path.read_bytes())
+        source = str(userdata_path)
+    else:
+        userdata = make_userdata(users, seed)
+        source = f"synthetic, {users} users"
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "source": source,
+            "default_backend": BACKEND,
+        }
+    }
+    click.echo(f"userdata: {source}, default backend {BACKEND}", err=True)
+    results["userdata"] = bench_serialize(userdata, repeat)
+    for name, stats in results["userdata"].items():
+        click.echo(
+            f"  {name:22} {stats['size_mb']:7.2f} MB  encode {stats['encode_ms']:8.1f} ms"
+            f" ({stats['encode_mb_s']:7.1f} MB/s)  decode {stats['decode_ms']:8.1f} ms"
+            f" ({stats['decode_mb_s']:7.1f} MB/s)",
+            err=True,
+        )
+
+    json.dump(results, output, indent=2)
+    output.write("\n")
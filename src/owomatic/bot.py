@@ -1,16 +1,18 @@
-import json
 import logging
 import os
 import platform
 import random
 import sys
 from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import datetime, timedelta
 from functools import partial as partial_func
 from pathlib import Path
 from traceback import print_exception
+from typing import Optional
 from zoneinfo import ZoneInfo
 
+from aiohttp import ClientSession
 from disnake import (
     Activity,
     ActivityType,
@@ -31,6 +33,8 @@ import exceptions
 from owomatic import COGDIR_PATH, DATADIR_PATH, USERDATA_PATH
 from owomatic.embeds import CooldownEmbed, MissingPermissionsEmbed
 from owomatic.helpers.misc import get_package_root
+from owomatic.helpers.serialize import write_json
+from owomatic.userdata import JsonUserdataStore, Userdata, UserdataStore, UserRecord
 
 PACKAGE_ROOT = get_package_root()
 
@@ -56,7 +60,8 @@ class Owomatic(commands.Bot):
         self.timezone: ZoneInfo = None
         self.datadir_path: Path = DATADIR_PATH
         self.userdata_path: Path = USERDATA_PATH
-        self.userdata: dict = None
+        self.userdata: Userdata = None
+        self.userdata_store: UserdataStore = JsonUserdataStore(USERDATA_PATH)
         self.cogdir_path: Path = COGDIR_PATH
         self.start_time: datetime = datetime.now(tz=ZoneInfo("UTC"))
         self.home_guild: Guild = None  # set in on_ready
@@ -64,6 +69,7 @@ class Owomatic(commands.Bot):
 
         # thread pool for blocking code
         self.executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix="bot")
+        self._http_session: Optional[ClientSession] = None
 
     @property
     def uptime(self) -> timedelta:
@@ -73,6 +79,18 @@ class Owomatic(commands.Bot):
     def fuzzyuptime(self) -> str:
         return fuzzydelta(self.uptime)
 
+    @property
+    def http_session(self) -> ClientSession:
+        """aiohttp session for cogs to share, closed along with the bot."""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = ClientSession()
+        return self._http_session
+
+    async def close(self) -> None:
+        await super().close()
+        if self._http_session is not None:
+            await self._http_session.close()
+
     async def do(self, func, *args, **kwargs):
         funcname = getattr(func, "__name__", None)
         if funcname is None:
@@ -81,35 +99,54 @@ class Owomatic(commands.Bot):
         return await self.loop.run_in_executor(self.executor, partial_func(func, *args, **kwargs))
 
     def save_userdata(self):
-        if self.userdata is not None and self.userdata_path.is_file():
-            with self.userdata_path.open("w") as f:
-                json.dump(self.userdata, f, skipkeys=True, indent=2)
+        if self.userdata is not None:
+            self.userdata_store.flush(self.userdata)
             # logger.debug("Flushed user states to disk")
 
+    async def flush_userdata(self):
+        # copy what changed here on the loop, write it out in the background
+        if self.userdata is not None:
+            snapshot = self.userdata_store.snapshot(self.userdata)
+            if snapshot is not None:
+                failed = await self.loop.run_in_executor(self.executor, self.userdata_store.write, snapshot)
+                # back on the loop, so this can't race snapshot() swapping the dirty set out
+                self.userdata_store.dirty.update(failed)
+                logger.debug("Flushed userdata to disk")
+
     def load_userdata(self):
-        if self.userdata_path.is_file():
-            with self.userdata_path.open("r") as f:
-                self.userdata = json.load(f)
-            logger.debug("Loaded user states from disk")
+        self.userdata = self.userdata_store.load()
+        logger.debug("Loaded user states from disk")
 
-    # Get a user's entire data dict from the userdata dict
-    def _get_userdata(self, user: Member, default={}) -> dict:
-        return self.userdata.get(user.id, default)
+    def close_userdata(self):
+        self.save_userdata()
+        self.userdata_store.close()
+
+    # Get a copy of a user's entire data dict from the userdata dict.
+    # Changes to it aren't saved until it's passed back to _set_userdata.
+    def _get_userdata(self, user: Member, default: Optional[dict] = None) -> dict:
+        record = self.userdata.get(user.id)
+        if record is None:
+            return {} if default is None else default
+        return deepcopy(record.data)
 
     # Set a user's entire data dict
     def _set_userdata(self, user: Member, data: dict) -> None:
-        self.userdata[user.id] = data
+        self.userdata[user.id] = UserRecord(user.id, data)
+        self.userdata_store.set_user(user.id, data)
 
-    # Get a specific key from a user's data dict
+    # Get a copy of a specific key from a user's data dict.
+    # Changes to it aren't saved until it's passed back to set_userdata_key.
     def get_userdata_key(self, user: Member, key: str, default=None):
-        userdata = self._get_userdata(user)
-        return userdata.get(key, default)
+        record = self.userdata.get(user.id)
+        return default if record is None or key not in record.data else deepcopy(record.data[key])
 
     # Set a specific key in a user's data dict
     def set_userdata_key(self, user: Member, key: str, value: str) -> None:
-        userdata = self._get_userdata(user)
-        userdata[key] = value
-        self._set_userdata(user, userdata)
+        record = self.userdata.get(user.id)
+        if record is None:
+            record = self.userdata[user.id] = UserRecord(user.id)
+        record.set(key, value)
+        self.userdata_store.set_key(user.id, key, value)
 
     def save_guild_metadata(self, guild_id: int):
         # get guild metadata (members, channels, etc.)
@@ -149,8 +186,7 @@ class Owomatic(commands.Bot):
         # save member_data
         guild_data_path = self.datadir_path.joinpath("guilds", f"{guild_id}-meta.json")
         guild_data_path.parent.mkdir(exist_ok=True, parents=True)
-        with guild_data_path.open("w") as f:
-            json.dump(guild_data, f, skipkeys=True, indent=2)
+        write_json(guild_data_path, guild_data, pretty=True)
 
     def available_cogs(self):
         cogs = [
@@ -199,10 +235,9 @@ class Owomatic(commands.Bot):
     @tasks.loop(minutes=3.0)
     async def userdata_task(self) -> None:
         """
-        Background task to flush user state to disk
+        Background task to flush changed user state to disk
         """
-        self.save_userdata()
-        logger.debug("Flushed userdata to disk")
+        await self.flush_userdata()
 
     async def on_ready(self) -> None:
         """
@@ -1,6 +1,6 @@
-import json
 import logging
 import sys
+from typing import Optional
 from zoneinfo import ZoneInfo
 
 import click
@@ -10,40 +10,50 @@ from daemonocle.cli import DaemonCLI
 
 import logsnake
 from owomatic.helpers.misc import parse_log_level
+from owomatic.helpers.serialize import dumps, read_json
 from owomatic import LOGDIR_PATH, DATADIR_PATH, COGDIR_PATH, CONFIG_PATH, USERDATA_PATH
+from owomatic.bench import bench
 from owomatic.bot import Owomatic
+from owomatic.userdata import open_userdata_store
 
 MBYTE = 2**20
 
-logfmt = logsnake.LogFormatter(datefmt="%Y-%m-%d %H:%M:%S")
-# setup root logger
-logging.root = logsnake.setup_logger(
-    level=logging.DEBUG,
-    isRootLogger=True,
-    formatter=logfmt,
-    logfile=LOGDIR_PATH.joinpath(f"{__package__}_debug.log"),
-    fileLoglevel=logging.DEBUG,
-    maxBytes=2 * MBYTE,
-    backupCount=5,
-)
-# setup package logger
-logger = logsnake.setup_logger(
-    level=logging.DEBUG,
-    isRootLogger=False,
-    name=__package__,
-    formatter=logfmt,
-    logfile=LOGDIR_PATH.joinpath(f"{__package__}.log"),
-    fileLoglevel=logging.DEBUG,
-    maxBytes=2 * MBYTE,
-    backupCount=5,
-)
-
-bot: Owomatic = Owomatic()
+logger = logging.getLogger(__package__)
+
+# created by cli(). nothing in this module may happen at import time: it's what the console script
+# imports, and spawned processes (the prompt inspector's decode workers) re-run the main script
+bot: Optional[Owomatic] = None
+
+
+def setup_logging():
+    logfmt = logsnake.LogFormatter(datefmt="%Y-%m-%d %H:%M:%S")
+    # setup root logger
+    logging.root = logsnake.setup_logger(
+        level=logging.DEBUG,
+        isRootLogger=True,
+        formatter=logfmt,
+        logfile=LOGDIR_PATH.joinpath(f"{__package__}_debug.log"),
+        fileLoglevel=logging.DEBUG,
+        maxBytes=2 * MBYTE,
+        backupCount=5,
+    )
+    # setup package logger
+    logsnake.setup_logger(
+        level=logging.DEBUG,
+        isRootLogger=False,
+        name=__package__,
+        formatter=logfmt,
+        logfile=LOGDIR_PATH.joinpath(f"{__package__}.log"),
+        fileLoglevel=logging.DEBUG,
+        maxBytes=2 * MBYTE,
+        backupCount=5,
+    )
 
 
 def cb_shutdown(message: str, code: int):
     logger.warning(f"Daemon is stopping: {code}")
-    bot.save_userdata()
+    if bot is not None:
+        bot.close_userdata()
     logger.info(message)
     return code
 
@@ -56,8 +66,26 @@ class BotDaemon(daemonocle.Daemon):
         pass
 
 
+class BotCLI(DaemonCLI):
+    """DaemonCLI, plus commands that run on their own rather than through the daemon."""
+
+    extra_commands = {"bench": bench}
+
+    def list_commands(self, ctx):
+        return super().list_commands(ctx) + sorted(self.extra_commands)
+
+    def get_command(self, ctx, name):
+        if name in self.extra_commands:
+            return self.extra_commands[name]
+        return super().get_command(ctx, name)
+
+    def invoke(self, ctx):
+        setup_logging()
+        return super().invoke(ctx)
+
+
 @click.command(
-    cls=DaemonCLI,
+    cls=BotCLI,
     daemon_class=BotDaemon,
     daemon_params={
         "name": "owomatic",
@@ -71,6 +99,8 @@ def cli(ctx: click.Context):
     """
     Main entrypoint for your application.
     """
+    global bot
+    bot = Owomatic()
     ctx.obj: Owomatic = bot
 
     # have to use a different method on python 3.11 and up because of a change to how asyncio works
@@ -81,7 +111,7 @@ def cli(ctx: click.Context):
     logger.info("Starting owomatic")
     # Load config
     if CONFIG_PATH.exists():
-        config = json.loads(CONFIG_PATH.read_bytes())
+        config = read_json(CONFIG_PATH)
     else:
         raise FileNotFoundError(f"Config file '{CONFIG_PATH}' not found!")
 
@@ -94,22 +124,19 @@ def cli(ctx: click.Context):
     if not LOGDIR_PATH.exists():
         LOGDIR_PATH.mkdir(parents=True)
 
-    # load userdata
-    if USERDATA_PATH.is_file():
-        userdata = json.loads(USERDATA_PATH.read_bytes())
-    else:
-        logger.info(f"User data file does not exist, creating empty one at {USERDATA_PATH}")
-        userdata = {}
-        USERDATA_PATH.write_text(json.dumps(userdata, indent=4))
+    # load userdata, the sqlite backend imports userdata.json the first time it's used
+    userdata_store = open_userdata_store(config.get("userdata_backend", "json"), bot.executor)
+    userdata = userdata_store.load()
 
     logger.info(f"Loaded configuration from {CONFIG_PATH}")
-    logger.debug(f"    {json.dumps(config, indent=4)}")
+    logger.debug(f"    {dumps(config, pretty=True).decode()}")
 
     bot.config = config
     bot.timezone = ZoneInfo(config["timezone"])
     bot.datadir_path = DATADIR_PATH
     bot.userdata_path = USERDATA_PATH
     bot.cogdir_path = COGDIR_PATH
+    bot.userdata_store = userdata_store
     bot.userdata = userdata
     bot.reload = config.get("reload", False)
     bot.hide = config.get("hide", False)
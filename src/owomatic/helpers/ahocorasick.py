@@ -0,0 +1,117 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher.
+
+    The automaton is built once from the pattern list, with the failure links folded into each
+    state's transition table, so a scan costs one or two dict lookups per character of input no
+    matter how many patterns there are. Transitions back through the root are left out of the
+    tables (every state would otherwise carry a copy of them) and looked up on a miss instead.
+
+    Characters in `ignore` are stripped from the patterns and skipped in the input, so matching
+    runs as if they'd been removed from the text beforehand, without making that copy. With
+    `collapse`, runs of the same character count as one, in both patterns and input ("owwwo" finds
+    "owo"); skipped characters don't interrupt a run unless they're also in `breaks`. Either way a
+    scan is still one pass over the input with constant work per character. Patterns that end up
+    empty are dropped.
+    """
+
+    __slots__ = ("patterns", "_delta", "_out", "_ignore", "_breaks", "_collapse")
+
+    def __init__(self, patterns: Iterable[str], ignore: str = "", collapse: bool = False, breaks: str = ""):
+        self._ignore = frozenset(ignore) | frozenset(breaks)
+        self._breaks = frozenset(breaks)
+        self._collapse = collapse
+
+        cleaned = set()
+        for original in patterns:
+            pattern = "".join(self._clean(original))
+            if pattern or not original:
+                cleaned.add(pattern)
+        self.patterns: frozenset[str] = frozenset(cleaned)
+
+        # build the trie
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Optional[str]] = [None]
+        for pattern in sorted(self.patterns):
+            state = 0
+            for char in pattern:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    out.append(None)
+                state = nxt
+            out[state] = pattern
+
+        # breadth-first so a state's failure target is always finished before the state itself
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [{}] * len(goto)
+        delta[0] = goto[0]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in goto[state].items():
+                fail[nxt] = (delta[fail[state]].get(char) or goto[0].get(char, 0)) if state else 0
+                queue.append(nxt)
+            if out[state] is None:
+                out[state] = out[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]} if fail[state] else goto[state]
+
+        if not collapse:
+            # skipping is a self-loop, which keeps it out of the scan loop entirely
+            for state, table in enumerate(delta):
+                for char in self._ignore:
+                    table[char] = state
+
+        self._delta = delta
+        self._out = out
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _clean(self, text: str) -> Iterator[str]:
+        # what the scan loop sees of a string, in the slow and obvious form
+        prev = None
+        for char in text:
+            if char in self._ignore:
+                if char in self._breaks:
+                    prev = None
+                continue
+            if self._collapse and char == prev:
+                continue
+            prev = char
+            yield char
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the first pattern (by end position) found in text, or None."""
+        delta, out = self._delta, self._out
+        if out[0] is not None:
+            return out[0]
+        root = delta[0].get
+        state = 0
+        if self._collapse:
+            ignore, breaks, prev = self._ignore, self._breaks, None
+            for char in text:
+                if char in ignore:
+                    if char in breaks:
+                        prev = None
+                    continue
+                if char == prev:
+                    continue
+                prev = char
+                state = delta[state].get(char) or root(char, 0)
+                if out[state] is not None:
+                    return out[state]
+            return None
+
+        for char in text:
+            # states other than the root are never 0, so a miss falls through to the root's edges
+            state = delta[state].get(char) or root(char, 0)
+            if out[state] is not None:
+                return out[state]
+        return None
@@ -1,9 +1,9 @@
-import json
 from typing import Callable, TypeVar
 
 from disnake.ext import commands
 
 from owomatic import CONFIG_PATH, DATADIR_PATH
+from owomatic.helpers.serialize import read_json
 from exceptions import UserBlacklisted, UserNotOwner
 
 T = TypeVar("T")
@@ -15,7 +15,7 @@ def is_owner() -> Callable[[T], T]:
     """
 
     async def predicate(context: commands.Context) -> bool:
-        data = json.loads(CONFIG_PATH.read_bytes())
+        data = read_json(CONFIG_PATH)
         if context.author.id not in data["owners"]:
             raise UserNotOwner
         return True
@@ -29,7 +29,7 @@ def not_blacklisted() -> Callable[[T], T]:
     """
 
     async def predicate(context: commands.Context) -> bool:
-        data = json.loads(DATADIR_PATH.joinpath("blacklist.json").read_bytes())
+        data = read_json(DATADIR_PATH.joinpath("blacklist.json"))
         if context.author.id in data["ids"]:
             raise UserBlacklisted
         return True
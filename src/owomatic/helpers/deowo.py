@@ -1,3 +1,12 @@
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+# generated from owodict/blanksdict plus the Unicode data by `python -m owomatic.helpers.owofold`
+OWOFOLD_PATH = Path(__file__).parent.joinpath("data", "owofold.txt")
+
+# hand-picked confusables; the generated table is built on top of these
 owodict = {
     10023: "o",
     1054: "O",
@@ -283,17 +292,84 @@ blanksdict = {  # fake spaces
     160: " ",
 }
 
-confUwUsable = str.maketrans(owodict)
-fakeblanks = str.maketrans(blanksdict)
+
+def read_owofold(path: Path = OWOFOLD_PATH) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """Load a generated table, returns (confusables, blanks) in the same shape as owodict/blanksdict"""
+    confusables, blanks = {}, {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line or line.startswith("#"):
+            continue
+        target, *sources = line.split()
+        target = chr(int(target, 16))
+        table = blanks if target == " " else confusables
+        table.update((int(x, 16), target) for x in sources)
+    return confusables, blanks
+
+
+@lru_cache(maxsize=None)
+def _owofold() -> Tuple[Dict[int, str], Dict[int, str]]:
+    # loaded on first use rather than at import
+    return read_owofold()
 
 
 def deUwUify(string: str) -> str:
-    return string.translate(confUwUsable)
+    return string.translate(_owofold()[0])
 
 
 def deOwOify(string: str) -> str:
-    return string.translate(confUwUsable)
+    return string.translate(_owofold()[0])
 
 
 def realspace(string: str) -> str:
-    return string.translate(fakeblanks)
+    return string.translate(_owofold()[1])
+
+
+@lru_cache(maxsize=None)
+def _fold_table(confusables: bool) -> dict:
+    # realspace(), str.lower() and (optionally) deOwOify() as one translation table, so folding a
+    # message is a single pass and a single copy. str.lower() has no table of its own, so pull one
+    # out of it; this walks every codepoint once, which is why it's cached.
+    if confusables:
+        owofold = _owofold()[0]
+        table = {cp: folded.translate(owofold) for cp, folded in _fold_table(False).items()}
+        for codepoint, char in owofold.items():
+            table.setdefault(codepoint, char)
+        return {codepoint: folded for codepoint, folded in table.items() if folded != chr(codepoint)}
+
+    table = {}
+    for codepoint in range(sys.maxunicode + 1):
+        char = chr(codepoint)
+        folded = char.lower()
+        if folded != char:
+            table[codepoint] = folded
+    table.update(_owofold()[1])
+    return table
+
+
+def foldspace(string: str) -> str:
+    """Same as realspace(string).lower()"""
+    return string.translate(_fold_table(False))
+
+
+def deOwOfold(string: str) -> str:
+    """Same as deOwOify(realspace(string).lower())"""
+    return string.translate(_fold_table(True))
+
+
+@lru_cache(maxsize=None)
+def _fold_sources() -> dict:
+    # inverse of the fold tables: char -> every char that foldspace() or deOwOfold() turns into it
+    sources = {}
+    for table in (_fold_table(False), _fold_table(True)):
+        for codepoint, folded in table.items():
+            for char in folded:
+                sources.setdefault(char, set()).add(chr(codepoint))
+    return sources
+
+
+def foldsources(char: str) -> frozenset:
+    """Every char that foldspace() or deOwOfold() turns into something containing `char`"""
+    sources = set(_fold_sources().get(char, ()))
+    if any(ord(char) not in table for table in (_fold_table(False), _fold_table(True))):
+        sources.add(char)
+    return frozenset(sources)
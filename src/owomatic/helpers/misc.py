@@ -1,5 +1,7 @@
 import logging
+import os
 from pathlib import Path
+from tempfile import NamedTemporaryFile
 from typing import Union
 
 
@@ -7,6 +9,20 @@ def get_package_root() -> Path:
     return Path(__file__).parent.parent.parent
 
 
+def atomic_write(path: Path, data: bytes) -> None:
+    """Write data to path via a temp file in the same directory, so readers see the old file or the new one."""
+    with NamedTemporaryFile("wb", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False) as f:
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
 def parse_log_level(level: Union[str, int]) -> int:
     if isinstance(level, str):
         level = level.lower()
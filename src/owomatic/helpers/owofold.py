@@ -0,0 +1,183 @@
+"""
+Generates the confusables/fake blanks table used by deowo (data/owofold.txt).
+
+The hand-picked owodict/blanksdict are the starting point, and are never overridden. On top of them:
+- every codepoint whose NFKC form is a single o/u/w/n (in either case), e.g. fullwidth forms,
+  mathematical alphanumerics, circled and squared letters
+- every space/line/paragraph separator
+- single-codepoint entries from the Unicode confusables.txt that map onto any of those. Only the
+  matching lines are vendored (data/confusables-owo.txt), refresh them from a full copy of
+  https://www.unicode.org/Public/security/latest/confusables.txt with --extract
+
+Usage:
+    python -m owomatic.helpers.owofold [--extract confusables.txt] [--output path] [--check]
+"""
+import argparse
+import sys
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from owomatic.helpers.deowo import OWOFOLD_PATH, blanksdict, owodict, read_owofold
+
+# what a lookalike of each letter should turn into, "n" goes to "w" the same way owodict has it
+TARGETS = {"o": "o", "O": "O", "u": "u", "U": "U", "w": "w", "W": "W", "n": "w", "N": "W"}
+BLANK_CATEGORIES = ("Zs", "Zl", "Zp")
+CONFUSABLES_PATH = OWOFOLD_PATH.with_name("confusables-owo.txt")
+
+
+def fold_target(char: str) -> Optional[str]:
+    if char == " ":
+        return " "
+    return TARGETS.get(unicodedata.normalize("NFKC", char))
+
+
+def is_redundant(char: str) -> bool:
+    # str.lower() gets to these before the table does, and ASCII is left alone
+    return char.isascii() or char.lower() in TARGETS
+
+
+def iter_confusables(path: Path) -> Iterator[Tuple[str, int, str]]:
+    """(line, source codepoint, folded target) for the single-codepoint entries of a confusables.txt
+    whose target folds onto something we want"""
+    # not splitlines(), the comments on the U+2028/U+2029 entries contain the characters themselves
+    for line in path.read_text(encoding="utf-8-sig").split("\n"):
+        line = line.rstrip("\r")
+        entry = line.split("#", 1)[0].strip()
+        if not entry:
+            continue
+        source, target, *_ = (x.strip() for x in entry.split(";"))
+        if " " in source or " " in target:
+            continue  # sequences, not something a translate table can do
+        folded = fold_target(chr(int(target, 16)))
+        if folded is not None:
+            yield line, int(source, 16), folded
+
+
+def read_confusables(path: Path) -> Dict[int, str]:
+    """Parse confusables.txt (or the vendored extract), keeping only what folds onto something we want"""
+    return {source: folded for _, source, folded in iter_confusables(path)}
+
+
+def confusables_header(path: Path) -> List[str]:
+    """The leading comment block of a confusables.txt: version, date and terms of use"""
+    header = []
+    for line in path.read_text(encoding="utf-8-sig").split("\n"):
+        if not line.startswith("#"):
+            break
+        header.append(line)
+    return header
+
+
+def write_confusables_extract(source: Path, path: Path) -> int:
+    """Vendor the lines of a full confusables.txt that read_confusables would keep, returns how many"""
+    lines = [line for line, _, _ in iter_confusables(source)]
+    header = [
+        "# Extract of the Unicode confusables.txt made by `python -m owomatic.helpers.owofold --extract`,",
+        "# only single-codepoint entries that fold onto o/u/w/n (in either case) or a space are kept.",
+        "#",
+        *confusables_header(source),
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join([*header, "", *lines]) + "\n", encoding="utf-8")
+    return len(lines)
+
+
+def confusables_source(path: Optional[Path]) -> str:
+    """How the generated table's header names the confusables it was built from"""
+    if path is None:
+        return "no confusables.txt"
+    for line in confusables_header(path):
+        if line.startswith("# Version:"):
+            return f"confusables.txt {line.split(':', 1)[1].strip()} ({path.name})"
+    return f"confusables.txt ({path.name})"
+
+
+def build_owofold(confusables: Optional[Path] = CONFUSABLES_PATH) -> Tuple[Dict[int, str], Dict[int, str]]:
+    owo, blanks = dict(owodict), dict(blanksdict)
+
+    generated = {}
+    for codepoint in range(sys.maxunicode + 1):
+        char = chr(codepoint)
+        if unicodedata.category(char) in BLANK_CATEGORIES:
+            generated[codepoint] = " "
+        elif not is_redundant(char):
+            folded = fold_target(char)
+            if folded is not None:
+                generated[codepoint] = folded
+    if confusables is not None:
+        generated.update(read_confusables(confusables))
+
+    for codepoint, target in generated.items():
+        if codepoint == ord(" ") or is_redundant(chr(codepoint)):
+            continue
+        (blanks if target == " " else owo).setdefault(codepoint, target)
+    return owo, blanks
+
+
+def format_owofold(owo: Dict[int, str], blanks: Dict[int, str], sources: str) -> str:
+    groups = defaultdict(list)
+    for codepoint, target in [*owo.items(), *blanks.items()]:
+        groups[target].append(codepoint)
+
+    lines = [
+        "# Generated by `python -m owomatic.helpers.owofold`, do not edit by hand.",
+        f"# Sources: owodict, blanksdict, Unicode {unicodedata.unidata_version} NFKC, {sources}",
+        "# <target> <codepoints that fold to it...>, all hex",
+    ]
+    for target in sorted(groups):
+        lines.append(" ".join(f"{x:04X}" for x in [ord(target), *sorted(groups[target])]))
+    return "\n".join(lines) + "\n"
+
+
+def write_owofold(path: Path, owo: Dict[int, str], blanks: Dict[int, str], sources: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(format_owofold(owo, blanks, sources), encoding="utf-8")
+
+
+def missing_entries(owo: Dict[int, str], blanks: Dict[int, str]) -> Dict[int, str]:
+    """Hand-picked owodict/blanksdict entries a table has lost or changed"""
+    table = {**owo, **blanks}
+    return {k: v for k, v in [*owodict.items(), *blanksdict.items()] if table.get(k) != v}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--confusables", type=Path, default=CONFUSABLES_PATH, help="confusables.txt or an extract of it"
+    )
+    parser.add_argument(
+        "--extract", type=Path, help="refresh the --confusables extract from a full confusables.txt first"
+    )
+    parser.add_argument("--output", type=Path, default=OWOFOLD_PATH)
+    parser.add_argument(
+        "--check", action="store_true", help="fail if --output isn't what would be generated, don't write it"
+    )
+    args = parser.parse_args()
+
+    if args.extract is not None:
+        count = write_confusables_extract(args.extract, args.confusables)
+        print(f"Wrote {count} confusables from {args.extract} to {args.confusables}")
+    owo, blanks = build_owofold(args.confusables)
+    sources = confusables_source(args.confusables)
+    if args.check:
+        if args.output.read_text(encoding="utf-8") != format_owofold(owo, blanks, sources):
+            raise SystemExit(
+                f"{args.output} is out of date, regenerate it with `python -m owomatic.helpers.owofold`"
+            )
+    else:
+        write_owofold(args.output, owo, blanks, sources)
+
+    # the generated table has to keep everything that was picked by hand
+    owo, blanks = read_owofold(args.output)
+    lost = missing_entries(owo, blanks)
+    if lost:
+        raise SystemExit(f"Generated table is missing hand-picked entries: {lost}")
+    print(
+        f"{'Checked' if args.check else 'Wrote'} {len(owo)} confusables and {len(blanks)} blanks in {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+JSON in and out for everything the bot keeps on disk, on the fastest library that's installed.
+
+orjson is used if it's there, then msgspec, then the stdlib json module. The only difference in
+their output is non-ASCII text, which the stdlib \\u-escapes (that's also what keeps it fast); all
+of them write int dict keys as strings, and each reads the others' files. `dumps` gives bytes and
+`loads` takes bytes or str. Anything that fails to decode raises ValueError, whichever library is
+underneath.
+
+`pretty` is 2-space indentation, for files people open in an editor. That's all orjson can do, so
+every backend uses it, and files that used to be written with 4 (blacklist.json) switch to 2 the
+next time they're saved; either reads back the same. Keys JSON can't hold (tuples and the like) are
+dropped by the stdlib backend, like the old `skipkeys=True` calls did, while orjson and msgspec raise
+TypeError, so anything writing data it didn't build itself should catch that as well as OSError.
+"""
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple, Union
+
+from owomatic.helpers.misc import atomic_write
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _json_dumps(obj: Any, pretty: bool = False) -> bytes:
+    if pretty:
+        return json.dumps(obj, skipkeys=True, indent=2).encode("utf-8")
+    return json.dumps(obj, skipkeys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: Union[bytes, str]) -> Any:
+    return json.loads(data)
+
+
+# name -> (dumps, loads), in order of preference
+BACKENDS: Dict[str, Tuple[Callable[..., bytes], Callable[[Union[bytes, str]], Any]]] = {}
+
+if orjson is not None:
+
+    def _orjson_dumps(obj: Any, pretty: bool = False) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+
+    BACKENDS["orjson"] = (_orjson_dumps, orjson.loads)  # orjson.JSONDecodeError is a ValueError
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_decoder = msgspec.json.Decoder()
+
+    def _msgspec_dumps(obj: Any, pretty: bool = False) -> bytes:
+        data = _msgspec_encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def _msgspec_loads(data: Union[bytes, str]) -> Any:
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    BACKENDS["msgspec"] = (_msgspec_dumps, _msgspec_loads)
+
+BACKENDS["json"] = (_json_dumps, _json_loads)
+
+BACKEND = next(iter(BACKENDS))
+dumps, loads = BACKENDS[BACKEND]
+
+
+def read_json(path: Path) -> Any:
+    return loads(path.read_bytes())
+
+
+def write_json(path: Path, obj: Any, pretty: bool = False, atomic: bool = False) -> None:
+    """Write obj to path, via a temp file and rename if `atomic` is set."""
+    data = dumps(obj, pretty)
+    if atomic:
+        atomic_write(path, data)
+    else:
+        path.write_bytes(data)
@@ -0,0 +1,522 @@
+"""
+Where per-user data lives between restarts.
+
+The bot keeps the working copy in memory (`Owomatic.userdata`) and tells the store about every
+change; the store decides what hitting the disk means. `JsonUserdataStore` is the original
+userdata.json, `JournaledJsonUserdataStore` adds an append-only journal so nothing waits for a
+flush, `ShardedJsonUserdataStore` keeps one file per user, and `SqliteUserdataStore` keeps one row
+per (user, key) in a WAL-mode database and upserts just the key that changed.
+
+In memory every user is a `UserRecord`, keyed by the integer user id. On disk, userdata.json
+carries a schema version; files from before that (bare `{"<user id>": {...}}`) still load, and
+whatever the format, user ids come back as ints so they line up with `Member.id`.
+
+Flushing is split in two: `snapshot()` runs on the event loop and copies only the users that changed
+since the last one, `write()` puts that copy on disk and is safe to run in a worker thread. It
+returns the ids it failed to write, which the caller puts back in `dirty` on the loop.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from owomatic import USERDATA_DB_PATH, USERDATA_JOURNAL_PATH, USERDATA_PATH, USERDATA_SHARDS_PATH
+from owomatic.helpers.serialize import dumps, loads, read_json, write_json
+
+logger = logging.getLogger(__package__)
+
+USERDATA_BACKENDS = ("json", "journal", "shards", "sqlite")
+
+# bump when the on-disk layout changes, and teach unpack_userdata() to read the old one
+USERDATA_VERSION = 1
+
+# seconds between journal fsyncs, and the journal size that triggers a rewrite of userdata.json
+JOURNAL_SYNC_INTERVAL = 1.0
+JOURNAL_COMPACT_BYTES = 1 * 2**20
+
+
+class UserRecord:
+    """One user's data. Slotted, since there's one per user the bot has ever stored anything for."""
+
+    __slots__ = ("user_id", "data")
+
+    def __init__(self, user_id: int, data: Optional[dict] = None):
+        self.user_id = user_id
+        self.data: dict = {} if data is None else data
+
+    def __repr__(self) -> str:
+        return f"UserRecord({self.user_id}, {self.data!r})"
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+
+Userdata = Dict[int, UserRecord]
+
+
+def unpack_userdata(obj: dict) -> Userdata:
+    """Turn a decoded userdata.json, of any version so far, into records keyed by int user id."""
+    if "version" in obj and "users" in obj:
+        version, users = obj["version"], obj["users"]
+    else:
+        version, users = 0, obj  # unversioned, the ids are the top level keys
+    if version > USERDATA_VERSION:
+        raise ValueError(
+            f"Userdata is schema version {version}, this bot only knows up to {USERDATA_VERSION}"
+        )
+
+    userdata = {}
+    for key, data in users.items():
+        try:
+            user_id = int(key)
+        except ValueError:
+            logger.warning(f"Skipping userdata entry with non-numeric user id {key!r}")
+            continue
+        if user_id in userdata:
+            # an int and a str copy of the same id, left behind by the old key churn
+            userdata[user_id].data.update(data)
+        else:
+            userdata[user_id] = UserRecord(user_id, data)
+    return userdata
+
+
+def pack_userdata(users: Dict[int, dict]) -> dict:
+    return {"version": USERDATA_VERSION, "users": users}
+
+
+class UserdataStore(ABC):
+    """Interface for userdata backends. Everything but write() is called from the event loop."""
+
+    def __init__(self):
+        self.dirty: set = set()
+
+    @abstractmethod
+    def load(self) -> Userdata:
+        """Read everything in, called once at startup."""
+
+    def set_key(self, user_id: int, key: str, value: Any) -> None:
+        """One key of one user changed."""
+        self.dirty.add(user_id)
+
+    def set_user(self, user_id: int, data: dict) -> None:
+        """A user's whole data dict was replaced."""
+        self.dirty.add(user_id)
+
+    def snapshot(self, userdata: Userdata) -> Optional[Any]:
+        """Copy whatever the next write needs, or None if nothing changed."""
+        return None
+
+    def write(self, snapshot: Any) -> Set[int]:
+        """Put a snapshot on disk, returning the ids of any users that didn't make it."""
+        return set()
+
+    def flush(self, userdata: Userdata) -> None:
+        snapshot = self.snapshot(userdata)
+        if snapshot is not None:
+            self.dirty.update(self.write(snapshot))
+
+    def close(self) -> None:
+        pass
+
+    def _take_dirty(self, userdata: Userdata) -> Dict[int, Optional[dict]]:
+        # deep copies, a cog can still change a value after handing it to set_userdata_key
+        dirty, self.dirty = self.dirty, set()
+        return {x: deepcopy(userdata[x].data) if x in userdata else None for x in dirty}
+
+    def _write_failed(self, snapshot: Dict[int, Optional[dict]]) -> Set[int]:
+        # runs on the writer thread, so the ids go back to the caller rather than into self.dirty
+        logger.exception("Failed to write userdata, will retry on the next flush")
+        return set(snapshot.keys())
+
+
+class JsonUserdataStore(UserdataStore):
+    """
+    Everything in one userdata.json. Still rewritten whole, but only when something changed, and
+    the snapshot only deep-copies the users that did; the rest are reused from the previous one.
+    """
+
+    def __init__(self, path: Path = USERDATA_PATH):
+        super().__init__()
+        self.path = path
+        self._copies: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> Userdata:
+        if not self.path.is_file():
+            logger.info(f"User data file does not exist, creating empty one at {self.path}")
+            write_json(self.path, pack_userdata({}), pretty=True)
+        userdata = unpack_userdata(read_json(self.path))
+        self._copies = {user_id: deepcopy(record.data) for user_id, record in userdata.items()}
+        return userdata
+
+    def snapshot(self, userdata: Userdata) -> Optional[dict]:
+        if not self.dirty:
+            return None
+        for user_id, data in self._take_dirty(userdata).items():
+            if data is None:
+                self._copies.pop(user_id, None)
+            else:
+                self._copies[user_id] = data
+        # the copies are replaced, never modified, so sharing them with the writer is fine
+        return dict(self._copies)
+
+    def write(self, snapshot: dict) -> Set[int]:
+        with self._lock:
+            try:
+                write_json(self.path, pack_userdata(snapshot), pretty=True, atomic=True)
+            except (OSError, TypeError, ValueError):
+                # TypeError/ValueError: a cog stored something the JSON backend can't encode
+                return self._write_failed(snapshot)
+        return set()
+
+
+class ShardedJsonUserdataStore(UserdataStore):
+    """One `<user id>.json` per user in a directory, a flush only touches the users that changed."""
+
+    def __init__(self, path: Path = USERDATA_SHARDS_PATH):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        path.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob("*.json"))
+
+    def load(self) -> Userdata:
+        userdata = {}
+        for shard in self.path.glob("*.json"):
+            try:
+                user_id = int(shard.stem)
+                userdata[user_id] = UserRecord(user_id, read_json(shard))
+            except ValueError:
+                logger.warning(f"Skipping unreadable userdata shard {shard}")
+        return userdata
+
+    def snapshot(self, userdata: Userdata) -> Optional[Dict[int, Optional[dict]]]:
+        return self._take_dirty(userdata) if self.dirty else None
+
+    def write(self, snapshot: Dict[int, Optional[dict]]) -> Set[int]:
+        with self._lock:
+            try:
+                for user_id, data in snapshot.items():
+                    shard = self.path.joinpath(f"{user_id}.json")
+                    if data is None:
+                        shard.unlink(missing_ok=True)
+                    else:
+                        write_json(shard, data, pretty=True, atomic=True)
+            except (OSError, TypeError, ValueError):
+                return self._write_failed(snapshot)
+        return set()
+
+
+class JournaledJsonUserdataStore(JsonUserdataStore):
+    """
+    userdata.json plus an append-only journal of every change since it was last written, one JSON
+    line per set_key/set_user. Records go to the OS as they happen and get fsynced in batches every
+    `sync_interval` seconds on `executor` (or straight away without one, or outside the event loop),
+    so a crash loses nothing and a power cut at most that much.
+
+    load() replays the journal over the snapshot, skipping any record it can't read and compacting
+    right away so they're gone for good; only an unreadable userdata.json stops it. Flushes do nothing until the journal grows past
+    `compact_bytes`; then it's rotated out of the way and the full snapshot is written in the
+    background, after which the rotated journal is deleted. Replaying a journal over a snapshot that
+    already includes it changes nothing, so a crash anywhere in between is harmless.
+    """
+
+    def __init__(
+        self,
+        path: Path = USERDATA_PATH,
+        journal_path: Path = USERDATA_JOURNAL_PATH,
+        sync_interval: float = JOURNAL_SYNC_INTERVAL,
+        compact_bytes: int = JOURNAL_COMPACT_BYTES,
+        executor: Optional[Executor] = None,
+    ):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.rotated_path = journal_path.with_name(f"{journal_path.name}.old")
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.executor = executor
+        self._journal = None
+        self._journal_bytes = 0
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        self._skipped = 0
+
+    def load(self) -> Userdata:
+        userdata = super().load()
+        replayed = set()
+        self._skipped = 0
+        for journal in (self.rotated_path, self.journal_path):
+            if journal.is_file():
+                replayed.update(self._replay(journal, userdata))
+        for user_id in replayed:
+            self._copies[user_id] = deepcopy(userdata[user_id].data)
+        if replayed:
+            logger.info(f"Replayed journal changes for {len(replayed)} users")
+        if self._skipped:
+            logger.warning(f"Skipped {self._skipped} unreadable journal records, compacting the journal")
+            if not super().write(dict(self._copies)):
+                self.rotated_path.unlink(missing_ok=True)
+                self.journal_path.unlink(missing_ok=True)
+        return userdata
+
+    def _replay(self, journal: Path, userdata: Userdata) -> set:
+        data = journal.read_bytes()
+        if not data.endswith(b"\n"):
+            # a crash in the middle of appending, drop the partial record so the next one starts clean
+            logger.warning(f"Dropping incomplete record at the end of {journal}")
+            data = data[: data.rfind(b"\n") + 1]
+            with journal.open("r+b") as f:
+                f.truncate(len(data))
+
+        replayed = set()
+        for lineno, line in enumerate(data.splitlines(), 1):
+            try:
+                user_id, key, value = loads(line)
+                if not isinstance(user_id, int) or (key is None and not isinstance(value, dict)):
+                    raise ValueError("not a [user id, key, value] record")
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Skipping unreadable record on line {lineno} of {journal}: {e}")
+                self._skipped += 1
+                continue
+            if key is None:
+                userdata[user_id] = UserRecord(user_id, value)
+            elif user_id in userdata:
+                userdata[user_id].set(key, value)
+            else:
+                userdata[user_id] = UserRecord(user_id, {key: value})
+            replayed.add(user_id)
+        return replayed
+
+    def set_key(self, user_id: int, key: str, value: Any) -> None:
+        super().set_key(user_id, key, value)
+        self._append([user_id, key, value])
+
+    def set_user(self, user_id: int, data: dict) -> None:
+        super().set_user(user_id, data)
+        self._append([user_id, None, data])
+
+    def _append(self, record: list) -> None:
+        if self._journal is None:
+            self._journal = self.journal_path.open("ab")
+            self._journal_bytes = self._journal.tell()
+        line = dumps(record) + b"\n"
+        self._journal.write(line)
+        self._journal.flush()
+        self._journal_bytes += len(line)
+        if self._sync_handle is None:
+            self._schedule_sync()
+
+    def _schedule_sync(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or self.executor is None:
+            self._sync()
+        else:
+            self._sync_handle = loop.call_later(self.sync_interval, self._start_sync)
+
+    def _start_sync(self) -> None:
+        # on the loop, so _append never sees a handle for a sync that's already under way
+        self._sync_handle = None
+        self.executor.submit(self._sync)
+
+    def _sync(self) -> None:
+        journal = self._journal
+        try:
+            os.fsync(journal.fileno())
+        except (AttributeError, ValueError):
+            pass  # rotated or closed since, which syncs it
+        except OSError:
+            logger.exception("Failed to sync userdata journal")
+
+    def snapshot(self, userdata: Userdata) -> Optional[dict]:
+        if self.rotated_path.exists():
+            pass  # the last compaction didn't finish, keep the rotated journal and try again
+        elif self._journal_bytes >= self.compact_bytes:
+            self._rotate()
+        else:
+            return None
+        snapshot = super().snapshot(userdata)
+        return dict(self._copies) if snapshot is None else snapshot
+
+    def _rotate(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self.journal_path.rename(self.rotated_path)
+        self._journal_bytes = 0
+
+    def write(self, snapshot: dict) -> Set[int]:
+        failed = super().write(snapshot)
+        if not failed:
+            self.rotated_path.unlink(missing_ok=True)
+            logger.debug(f"Compacted userdata journal into {self.path}")
+        return failed
+
+    def close(self) -> None:
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if self._journal is not None:
+            self._sync()
+            self._journal.close()
+            self._journal = None
+
+
+class SqliteUserdataStore(UserdataStore):
+    """
+    One row per (user, key), value stored as JSON. Writes are queued in order and drained in a
+    single transaction on `executor` (or inline if there isn't one), so a burst of changes costs one
+    commit, and a crash loses at most whatever was still in the queue.
+    """
+
+    def __init__(self, path: Path = USERDATA_DB_PATH, executor: Optional[Executor] = None):
+        super().__init__()
+        self.path = path
+        self.executor = executor
+        self._pending = deque()
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # autocommit, transactions are opened explicitly in _drain
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS userdata ("
+            "user_id INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, key)) WITHOUT ROWID"
+        )
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version > USERDATA_VERSION:
+            raise ValueError(
+                f"{path} is schema version {version}, this bot only knows up to {USERDATA_VERSION}"
+            )
+        self._db.execute(f"PRAGMA user_version = {USERDATA_VERSION}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(DISTINCT user_id) FROM userdata").fetchone()[0]
+
+    def load(self) -> Userdata:
+        self._drain()
+        userdata = {}
+        with self._lock:
+            for user_id, key, value in self._db.execute("SELECT user_id, key, value FROM userdata"):
+                if user_id not in userdata:
+                    userdata[user_id] = UserRecord(user_id)
+                userdata[user_id].set(key, loads(value))
+        return userdata
+
+    def set_key(self, user_id: int, key: str, value: Any) -> None:
+        # serialized now, so later changes to a mutable value can't race the write
+        self._pending.append((user_id, {key: dumps(value).decode("utf-8")}, False))
+        self._schedule()
+
+    def set_user(self, user_id: int, data: dict) -> None:
+        values = {k: dumps(v).decode("utf-8") for k, v in data.items()}
+        self._pending.append((user_id, values, True))
+        self._schedule()
+
+    def snapshot(self, userdata: Userdata) -> Optional[int]:
+        # every change is already on its way to the database, so the periodic flush only has
+        # something to do when a failed drain left changes behind with nothing left to retry them
+        if self._pending and not self._scheduled:
+            return len(self._pending)
+        return None
+
+    def write(self, snapshot: int) -> Set[int]:
+        self._drain()
+        return set()
+
+    def flush(self, userdata: Userdata) -> None:
+        self._drain()
+
+    def close(self) -> None:
+        if self._db is None:
+            return
+        self._drain()
+        with self._lock:
+            self._db.close()
+            self._db = None
+
+    def _schedule(self) -> None:
+        if self.executor is None:
+            self._drain()
+        elif not self._scheduled:
+            self._scheduled = True
+            self.executor.submit(self._drain)
+
+    def _drain(self) -> None:
+        with self._lock:
+            # cleared first, anything queued from here on is either picked up below or gets its own job
+            self._scheduled = False
+            if not self._pending:
+                return
+            if self._db is None:
+                logger.error(f"Userdata database is closed, dropping {len(self._pending)} queued changes")
+                self._pending.clear()
+                return
+            batch = []
+            try:
+                self._db.execute("BEGIN")
+                while self._pending:
+                    batch.append(self._pending.popleft())
+                    user_id, values, replace = batch[-1]
+                    if replace:
+                        self._db.execute("DELETE FROM userdata WHERE user_id = ?", (user_id,))
+                    self._db.executemany(
+                        "INSERT INTO userdata (user_id, key, value) VALUES (?, ?, ?) "
+                        "ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value",
+                        [(user_id, k, v) for k, v in values.items()],
+                    )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                logger.exception("Failed to write userdata to the database, will retry on the next flush")
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                # back on the front of the queue in the same order, ahead of anything queued since
+                self._pending.extendleft(reversed(batch))
+
+
+def migrate_json_userdata(json_path: Path, store: UserdataStore) -> int:
+    """
+    One-shot import of a userdata.json into another store. The JSON file is renamed to
+    `<name>.migrated` afterwards so it isn't imported twice. Returns the number of users copied.
+    """
+    userdata = unpack_userdata(read_json(json_path))
+    for user_id, record in userdata.items():
+        store.set_user(user_id, record.data)
+    store.flush(userdata)
+    json_path.rename(json_path.with_name(f"{json_path.name}.migrated"))
+    logger.info(f"Migrated {len(userdata)} users from {json_path}")
+    return len(userdata)
+
+
+def open_userdata_store(backend: str = "json", executor: Optional[Executor] = None) -> UserdataStore:
+    if backend == "json":
+        return JsonUserdataStore(USERDATA_PATH)
+    elif backend == "journal":
+        return JournaledJsonUserdataStore(USERDATA_PATH, USERDATA_JOURNAL_PATH, executor=executor)
+    elif backend == "shards":
+        store = ShardedJsonUserdataStore(USERDATA_SHARDS_PATH)
+    elif backend == "sqlite":
+        store = SqliteUserdataStore(USERDATA_DB_PATH, executor)
+    else:
+        raise ValueError(f"Unknown userdata backend '{backend}', expected one of {USERDATA_BACKENDS}")
+    if USERDATA_PATH.is_file() and len(store) == 0:
+        migrate_json_userdata(USERDATA_PATH, store)
+    return store
@@ -0,0 +1,4 @@
+from pathlib import Path
+
+# the cogs set up their file loggers at import time, under ./logs
+Path.cwd().joinpath("logs").mkdir(exist_ok=True)
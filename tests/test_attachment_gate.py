@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import cogs.prompt_inspector as prompt_inspector
+from cogs.prompt_inspector import AttachmentGate, PromptInspector, ScanStore
+
+
+def attachment(filename="a.png", content_type="image/png", size=1000, width=512, height=512):
+    return SimpleNamespace(
+        filename=filename, content_type=content_type, size=size, width=width, height=height
+    )
+
+
+def test_reject_reasons():
+    gate = AttachmentGate({"max_bytes": 2000, "max_pixels": 512 * 512})
+    assert gate.reject_reason(attachment()) is None
+    # parameters on the content type don't matter
+    assert gate.reject_reason(attachment(content_type="image/png; charset=binary")) is None
+    assert gate.reject_reason(attachment(content_type="image/jpeg")) == "content type"
+    # the content type wins over the extension when Discord sends one...
+    assert gate.reject_reason(attachment(filename="a.jpg")) is None
+    assert gate.reject_reason(attachment(filename="a.png", content_type="image/gif")) == "content type"
+    # ...and the extension is only the fallback when it doesn't
+    assert gate.reject_reason(attachment(filename="a.PNG", content_type=None)) is None
+    assert gate.reject_reason(attachment(filename="a.jpg", content_type=None)) == "extension"
+    assert gate.reject_reason(attachment(size=2001)) == "too many bytes"
+    assert gate.reject_reason(attachment(width=513)) == "too many pixels"
+    # no dimensions, nothing to check
+    assert gate.reject_reason(attachment(width=None, height=None)) is None
+
+
+def test_filter_caps_attachments_and_counts_skips():
+    gate = AttachmentGate({"max_attachments": 2})
+    attachments = [
+        attachment(content_type="text/plain"),
+        attachment(),
+        attachment(size=64 * 2**20),
+        attachment(),
+        attachment(),
+    ]
+    # indices are into the original list, rejected ones don't use up the cap
+    assert gate.filter(attachments) == [(1, attachments[1]), (3, attachments[3])]
+    assert gate.stats() == {
+        "skipped: content type": 1,
+        "skipped: too many bytes": 1,
+        "skipped: too many attachments": 1,
+    }
+
+
+def test_scan_store_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    store = ScanStore(maxsize=2, ttl=60.0)
+    store.put(1, "one")
+    now[0] += 30
+    store.put(2, "two")
+    assert (store.get(1), store.get(2)) == ("one", "two")
+    now[0] += 31
+    # 1 is past its TTL, 2 isn't yet
+    assert (store.get(1), store.get(2)) == (None, "two")
+    store.put(3, "three")
+    store.put(4, "four")
+    # over maxsize, the oldest goes first
+    assert (store.get(2), store.get(3), store.get(4)) == (None, "three", "four")
+    # re-putting refreshes both the TTL and the eviction order
+    now[0] += 50
+    store.put(3, "three again")
+    now[0] += 20
+    assert (store.get(3), store.get(4)) == ("three again", None)
+
+
+def scan_inspector(results):
+    inspector = PromptInspector.__new__(PromptInspector)
+    inspector.bot = SimpleNamespace(http_session=None)
+    inspector.gate = AttachmentGate({})
+    inspector.decoder = inspector.cache = None
+    inspector.scans = ScanStore()
+    inspector.reads = 0
+
+    async def read_attachment_metadata(i, attachment, metadata, decoder, cache, session):
+        inspector.reads += 1
+        if results[i]:
+            metadata[i] = "Steps: 20"
+        return results[i]
+
+    return inspector, read_attachment_metadata
+
+
+def test_failed_scans_are_not_remembered(monkeypatch):
+    # the second attachment's download fails
+    results = [True, False]
+    inspector, fake_read = scan_inspector(results)
+    monkeypatch.setattr(prompt_inspector, "read_attachment_metadata", fake_read)
+    message = SimpleNamespace(id=1, attachments=[attachment(), attachment()])
+
+    async def run():
+        first = await inspector.scan_message(message)
+        assert inspector.scans.get(message.id) is None
+        results[1] = True
+        second = await inspector.scan_message(message)
+        # a successful scan is shared with the next caller
+        assert await inspector.scan_message(message) is second
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == {0: "Steps: 20", 1: None}
+    assert second == {0: "Steps: 20", 1: "Steps: 20"}
+    assert inspector.reads == 4
@@ -0,0 +1,42 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from benchmarks.fixtures import PARAMETERS, make_png
+from cogs.prompt_inspector import DecodePool
+
+
+def test_workers_start_outside_the_bot_directory(tmp_path, monkeypatch):
+    # the daemon moves the bot to /, which has no logs/ or data/ for a worker to trip over
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        pool = DecodePool(max_workers=1)
+        try:
+            return await pool.extract(make_png((64, 64), "text")), pool.stats()
+        finally:
+            pool.shutdown()
+
+    info, stats = asyncio.run(run())
+    assert info == PARAMETERS
+    assert (stats["completed"], stats["failed"]) == (1, 0)
+
+
+def test_pool_is_replaced_after_a_worker_dies():
+    async def run():
+        pool = DecodePool(max_workers=1)
+        try:
+            # stand-in for a worker killed mid-decode
+            with pytest.raises(BrokenProcessPool):
+                pool.executor.submit(os._exit, 1).result()
+            with pytest.raises(BrokenProcessPool):
+                await pool.extract(make_png((64, 64), "text"))
+            return await pool.extract(make_png((64, 64), "stealth-alpha")), pool.stats()
+        finally:
+            pool.shutdown()
+
+    info, stats = asyncio.run(run())
+    assert info == PARAMETERS
+    assert (stats["completed"], stats["failed"], stats["pool rebuilds"]) == (1, 1, 1)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientPayloadError, ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from benchmarks.fixtures import PARAMETERS, make_png
+from cogs.prompt_inspector import FETCH_CHUNK_SIZE, fetch_attachment
+from owomatic.helpers.pnginfo import read_png_parameters
+
+FILES = web.AppKey("files", dict)
+
+
+async def truncated(request: web.Request) -> web.StreamResponse:
+    body = request.app[FILES]["not-a.png"]
+    resp = web.StreamResponse()
+    resp.content_length = len(body)
+    await resp.prepare(request)
+    await resp.write(body[: len(body) // 2])
+    request.transport.close()
+    return resp
+
+
+async def serve(request: web.Request) -> web.Response:
+    return web.Response(body=request.app[FILES][request.match_info["name"]])
+
+
+def fetch(files, name):
+    async def run():
+        app = web.Application()
+        app[FILES] = files
+        app.router.add_get("/truncated", truncated)
+        app.router.add_get("/{name}", serve)
+        async with TestServer(app) as server, ClientSession() as session:
+            return await fetch_attachment(session, str(server.make_url(f"/{name}")))
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(scope="module")
+def files():
+    return {
+        "big-text.png": make_png((1024, 1536), "text"),
+        "small-text.png": make_png((128, 192), "text", compress_level=0),
+        "plain.png": make_png((512, 512), "plain"),
+        "not-a.png": bytes(range(256)) * 1024,
+    }
+
+
+def test_stops_once_parameters_are_found(files):
+    data, complete = fetch(files, "big-text.png")
+    assert not complete
+    assert len(data) < len(files["big-text.png"])
+    assert read_png_parameters(data) == PARAMETERS
+
+
+def test_small_file_read_in_full_is_complete(files):
+    # just over one chunk, so the first check finds the parameters with the rest already received
+    assert FETCH_CHUNK_SIZE < len(files["small-text.png"]) < 2 * FETCH_CHUNK_SIZE
+    assert fetch(files, "small-text.png") == (files["small-text.png"], True)
+
+
+def test_non_png_is_read_in_full(files):
+    assert fetch(files, "not-a.png") == (files["not-a.png"], True)
+
+
+def test_plain_png_stops_without_stealth_signature(files):
+    data, complete = fetch(files, "plain.png")
+    assert not complete
+    assert files["plain.png"].startswith(data)
+    assert read_png_parameters(data) is None
+
+
+def test_truncated_body_raises(files):
+    with pytest.raises(ClientPayloadError):
+        fetch(files, "truncated")
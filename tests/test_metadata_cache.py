@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from cogs.prompt_inspector import MISSING, MetadataCache, read_attachment_metadata
+from owomatic.helpers.pnginfo import PNG_MAGIC, extract_metadata
+
+
+def test_content_hit_after_attachment_miss_counts_as_hit():
+    async def run():
+        cache = MetadataCache()
+        await cache.put(1, "abc", "Steps: 20")
+        # a repost: new attachment ID, same bytes
+        assert await cache.get_attachment(2) is MISSING
+        assert await cache.get_content("abc") == "Steps: 20"
+        assert await cache.get_attachment(1) == "Steps: 20"
+        return cache
+
+    cache = asyncio.run(run())
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_disk_tier_round_trip(tmp_path):
+    async def run():
+        cache = MetadataCache(cache_dir=tmp_path)
+        await cache.put(1, "abc", "Steps: 20")
+        await cache.put(2, "def", None)
+        # a fresh cache only has the disk to go on
+        cache = MetadataCache(cache_dir=tmp_path)
+        return await cache.get_attachment(1), await cache.get_attachment(2), await cache.get_content("def")
+
+    assert asyncio.run(run()) == ("Steps: 20", None, None)
+
+
+def test_partial_results_stay_in_memory(tmp_path):
+    async def run():
+        cache = MetadataCache(cache_dir=tmp_path)
+        await cache.put(1, "partial-1", None)
+        assert await cache.get_attachment(1) is None
+
+    asyncio.run(run())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sweep_drops_expired_then_oldest(tmp_path):
+    async def run():
+        cache = MetadataCache(cache_dir=tmp_path, disk_maxsize=4, disk_ttl=3600, sweep_every=1000)
+        for i in range(4):
+            await cache.put(i, f"digest{i}", "Steps: 20")
+        return cache
+
+    cache = asyncio.run(run())
+    now = time.time()
+    for i in range(4):
+        # entry 0 has expired, the rest are ordered oldest first
+        mtime = now - 7200 if i == 0 else now - 100 + i
+        for path in (tmp_path / f"digest{i}.txt", tmp_path / f"{i}.ref"):
+            os.utime(path, (mtime, mtime))
+
+    assert cache.sweep() == 4
+    assert sorted(x.name for x in tmp_path.iterdir()) == ["2.ref", "3.ref", "digest2.txt", "digest3.txt"]
+
+
+class FakeAttachment:
+    def __init__(self, attachment_id: int, data: bytes):
+        self.id = attachment_id
+        self.filename = f"{attachment_id}.png"
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+
+class BrokenDecoder:
+    async def extract(self, image_data: bytes):
+        raise BrokenProcessPool("worker died")
+
+
+def test_pool_failures_are_not_cached(tmp_path):
+    async def run():
+        cache = MetadataCache(cache_dir=tmp_path)
+        metadata = {}
+        ok = await read_attachment_metadata(0, FakeAttachment(1, b"data"), metadata, BrokenDecoder(), cache)
+        return ok, metadata, await cache.get_attachment(1)
+
+    assert asyncio.run(run()) == (False, {}, MISSING)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_undecodable_images_have_no_metadata():
+    assert extract_metadata(b"not an image") is None
+    assert extract_metadata(PNG_MAGIC + b"\0\0\0\rIHDR" + b"\xff" * 32) is None
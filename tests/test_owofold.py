@@ -0,0 +1,34 @@
+import unicodedata
+
+import pytest
+
+from owomatic.helpers.deowo import OWOFOLD_PATH, read_owofold
+from owomatic.helpers.owofold import (
+    CONFUSABLES_PATH,
+    build_owofold,
+    confusables_source,
+    format_owofold,
+    missing_entries,
+    read_confusables,
+    write_confusables_extract,
+)
+
+
+def test_committed_table_keeps_hand_picked_entries():
+    assert missing_entries(*read_owofold()) == {}
+
+
+def test_committed_table_matches_generator():
+    committed = OWOFOLD_PATH.read_text(encoding="utf-8")
+    if f"Unicode {unicodedata.unidata_version} NFKC" not in committed:
+        pytest.skip(
+            f"table was generated against a different Unicode version than {unicodedata.unidata_version}"
+        )
+    assert committed == format_owofold(*build_owofold(), confusables_source(CONFUSABLES_PATH))
+
+
+def test_vendored_extract_is_its_own_extract(tmp_path):
+    # nothing the generator uses was filtered out of the vendored extract
+    extract = tmp_path / "extract.txt"
+    write_confusables_extract(CONFUSABLES_PATH, extract)
+    assert read_confusables(extract) == read_confusables(CONFUSABLES_PATH)
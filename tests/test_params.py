@@ -0,0 +1,79 @@
+import random
+
+from benchmarks.bench_params import CORPUS
+from cogs.prompt_inspector import MAX_FIELD_LEN, get_params_from_string
+
+
+def parse(param_str: str) -> dict:
+    return get_params_from_string.__wrapped__(param_str)
+
+
+def test_prompts_and_plain_values():
+    fields = parse(CORPUS[0])
+    assert fields["Prompt"].startswith("masterpiece, best quality")
+    assert fields["Negative Prompt"].endswith("low quality")
+    assert fields["Sampler"] == "DPM++ 2M Karras"
+    assert fields["Version"] == "v1.6.0"
+
+
+def test_quoted_values_keep_their_commas():
+    fields = parse(CORPUS[1])
+    assert fields["Lora hashes"] == "add_detail: 7c6bad76eb54, wizard_hat_v2: 1a2b3c4d5e6f"
+    assert fields["TI hashes"] == "easynegative: c74b4e810b03"
+    assert fields["Version"] == "v1.7.0"
+    assert "wizard_hat_v2" not in fields
+
+
+def test_bracketed_and_escaped_values():
+    fields = parse(CORPUS[3])
+    assert fields["ADetailer prompt"] == "detailed face, sharp eyes"
+    assert fields["Hashes"] == '{"vae": "235745af8d", "model": "31e35c80fc"}'
+    assert fields["Version"] == "v1.9.4"
+
+    fields = parse('p\nSteps: 20, Wildcard prompt: "say \\"hi, there\\"", Styles: [a, b], Seed: 1')
+    assert fields["Wildcard prompt"] == 'say "hi, there"'
+    assert fields["Styles"] == "[a, b]"
+    assert fields["Seed"] == "1"
+
+
+def test_nested_and_awkward_values():
+    fields = parse('p\nSteps: 20, Styles: [a, [b, c]], Hashes: {"a": "}, ]", "b": {"c": [1]}}, Seed: 1')
+    assert fields["Styles"] == "[a, [b, c]]"
+    assert fields["Hashes"] == '{"a": "}, ]", "b": {"c": [1]}}'
+    assert fields["Seed"] == "1"
+
+    # an escaped backslash right before the closing quote
+    fields = parse('p\nSteps: 20, Path: "C:\\\\", Seed: 1')
+    assert fields["Path"] == "C:\\"
+    assert fields["Seed"] == "1"
+
+    # stealth payloads are arbitrary text, control characters included
+    fields = parse('p\nSteps: 20, A: "x\x01y", B: [1, 2]\x01, C: "\x00", D: \x01')
+    assert (fields["A"], fields["B"], fields["C"], fields["D"]) == ("x\x01y", "[1, 2]", "\x00", "\x01")
+
+
+def test_unclosed_values_are_plain_text():
+    fields = parse('p\nSteps: 20, A: "open, B: [x, C: {y')
+    assert (fields["A"], fields["B"], fields["C"]) == ('"open', "[x", "{y")
+
+
+def test_arbitrary_text_never_raises():
+    rng = random.Random(0)
+    alphabet = ['"', "\\", "[", "]", "{", "}", ", ", ": ", "\x01", "\x00", "Key", "\n"]
+    for _ in range(2000):
+        parse("p\nSteps: " + "".join(rng.choice(alphabet) for _ in range(rng.randrange(40))))
+
+
+def test_lines_after_params():
+    fields = parse(CORPUS[5])
+    assert fields["Prompt"].count("\n") == 2
+    assert fields["Negative Prompt"] == ""
+    assert fields["Version"] == "v1.8.0"
+    assert fields["Template"] == "line one of the prompt"
+
+
+def test_no_params_and_truncation():
+    assert parse("just a prompt\n") == {"Prompt": "just a prompt"}
+    fields = parse("x" * 2000 + "\nSteps: 20")
+    assert fields["Prompt"] == "x" * MAX_FIELD_LEN + "..."
+    assert fields["Steps"] == "20"
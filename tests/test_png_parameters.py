@@ -0,0 +1,87 @@
+import struct
+import zlib
+from io import BytesIO
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+from owomatic.helpers.pnginfo import find_png_parameters
+
+# non-ASCII, so the latin-1 (tEXt/zTXt) and UTF-8 (iTXt) decoding both get checked
+TEXT = "a café at night, «warm light»\nSteps: 20, Sampler: Euler a, Seed: 1"
+
+
+def save_png(pnginfo: PngImagePlugin.PngInfo) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (16, 16), (40, 80, 120)).save(buf, format="PNG", pnginfo=pnginfo)
+    return buf.getvalue()
+
+
+def text_png(kind: str) -> bytes:
+    pnginfo = PngImagePlugin.PngInfo()
+    pnginfo.add_text("Software", "test")  # an unrelated text chunk first
+    if kind == "tEXt":
+        pnginfo.add_text("parameters", TEXT)
+    elif kind == "zTXt":
+        pnginfo.add_text("parameters", TEXT, zip=True)
+    else:
+        pnginfo.add_itxt("parameters", TEXT, lang="en", tkey="Parameter", zip=kind == "iTXt-compressed")
+    return save_png(pnginfo)
+
+
+def chunk_offsets(data: bytes) -> dict:
+    offsets, pos = {}, 8
+    while pos < len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, pos)
+        offsets.setdefault(chunk_type, pos)
+        pos += length + 12
+    return offsets
+
+
+@pytest.mark.parametrize("kind", ["tEXt", "zTXt", "iTXt", "iTXt-compressed"])
+def test_text_chunks_match_pil(kind):
+    data = text_png(kind)
+    assert chunk_offsets(data).keys() >= {kind[:4].encode()}
+    with Image.open(BytesIO(data)) as img:
+        expected = img.info["parameters"]
+    # tEXt and zTXt are latin-1, so PIL and we both read the UTF-8 bytes back as mojibake
+    assert find_png_parameters(data) == (expected, True)
+    if kind.startswith("iTXt"):
+        assert expected == TEXT
+
+
+def test_missing_parameters_is_final_at_idat():
+    pnginfo = PngImagePlugin.PngInfo()
+    pnginfo.add_text("Software", "test")
+    data = save_png(pnginfo)
+    assert find_png_parameters(data) == (None, True)
+    assert find_png_parameters(data[: chunk_offsets(data)[b"IDAT"] + 8]) == (None, True)
+
+
+def test_text_after_idat_is_ignored_like_pil():
+    data = save_png(None)
+    body = b"parameters\0" + TEXT.encode("latin-1", "replace")
+    text = struct.pack(">I", len(body)) + b"tEXt" + body + struct.pack(">I", zlib.crc32(b"tEXt" + body))
+    iend = chunk_offsets(data)[b"IEND"]
+    data = data[:iend] + text + data[iend:]
+    with Image.open(BytesIO(data)) as img:
+        assert "parameters" not in img.info
+    assert find_png_parameters(data) == (None, True)
+
+
+@pytest.mark.parametrize("kind", ["tEXt", "zTXt", "iTXt-compressed"])
+def test_truncated_before_idat_is_not_final(kind):
+    data = text_png(kind)
+    offsets = chunk_offsets(data)
+    text_start = offsets[kind[:4].encode()]
+    # no chunks yet, in the middle of IHDR, and in the middle of the parameters chunk
+    for cut in (8, 20, text_start + 4, text_start + 30):
+        assert find_png_parameters(data[:cut]) == (None, False), cut
+
+
+def test_corrupt_compressed_text_is_final():
+    data = bytearray(text_png("zTXt"))
+    start = chunk_offsets(bytes(data))[b"zTXt"]
+    # garble the zlib stream, past the keyword and compression method byte
+    data[start + 8 + len(b"parameters\0") + 3] ^= 0xFF
+    assert find_png_parameters(bytes(data)) == (None, True)
@@ -0,0 +1,32 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from benchmarks.fixtures import PARAMETERS, VARIANTS, make_png, read_info_from_image_stealth_reference
+from owomatic.helpers.pnginfo import read_info_from_image_stealth
+
+# small, and with odd heights so the payload doesn't end on a column boundary
+SIZES = [(64, 64), (61, 97), (200, 33)]
+
+
+@pytest.mark.parametrize("size", SIZES, ids=lambda x: f"{x[0]}x{x[1]}")
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_matches_reference(size, variant):
+    with Image.open(BytesIO(make_png(size, variant))) as img:
+        img.load()
+        expected = read_info_from_image_stealth_reference(img)
+        assert read_info_from_image_stealth(img) == expected
+
+    if variant.startswith("stealth"):
+        assert expected == PARAMETERS
+    else:
+        assert expected is None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_no_signature_noise(mode):
+    # random LSBs, no signature anywhere
+    img = Image.effect_noise((80, 80), 64).convert(mode)
+    assert read_info_from_image_stealth(img) is None
+    assert read_info_from_image_stealth_reference(img) is None
@@ -0,0 +1,92 @@
+import struct
+import zlib
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmarks.fixtures import VARIANTS, make_pixels, make_png, read_info_from_image_stealth_reference
+from owomatic.helpers.pnginfo import PNG_MAGIC, STEALTH_SIG_BITS, png_column_zero, probe_stealth_signature
+
+FILTERS = {"none": 0, "sub": 1, "up": 2, "average": 3, "paeth": 4}
+
+
+def filter_rows(pixels: np.ndarray, filter_type: int) -> bytes:
+    """PNG-filter every scanline of an (H, W, C) uint8 image with one filter type."""
+    height, width, channels = pixels.shape
+    rows = pixels.reshape(height, -1).astype(np.int16)
+    out = []
+    above = np.zeros_like(rows[0])
+    for row in rows:
+        left = np.concatenate([np.zeros(channels, np.int16), row[:-channels]])
+        upper_left = np.concatenate([np.zeros(channels, np.int16), above[:-channels]])
+        if filter_type == 0:
+            predicted = np.zeros_like(row)
+        elif filter_type == 1:
+            predicted = left
+        elif filter_type == 2:
+            predicted = above
+        elif filter_type == 3:
+            predicted = (left + above) >> 1
+        else:
+            estimate = left + above - upper_left
+            pa, pb, pc = abs(estimate - left), abs(estimate - above), abs(estimate - upper_left)
+            predicted = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, above, upper_left))
+        out.append(bytes([filter_type]) + ((row - predicted) % 256).astype(np.uint8).tobytes())
+        above = row
+    return b"".join(out)
+
+
+def chunk(chunk_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+
+def encode_png(pixels: np.ndarray, filter_type: int, idat_size: int = 1000) -> bytes:
+    height, width, channels = pixels.shape
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2 if channels == 3 else 6, 0, 0, 0)
+    stream = zlib.compress(filter_rows(pixels, filter_type))
+    # several IDATs, so the probe has to carry the inflater across chunk boundaries
+    idats = b"".join(chunk(b"IDAT", stream[i : i + idat_size]) for i in range(0, len(stream), idat_size))
+    return PNG_MAGIC + chunk(b"IHDR", ihdr) + idats + chunk(b"IEND", b"")
+
+
+def stealth_pixels(size, variant) -> np.ndarray:
+    with Image.open(BytesIO(make_png(size, variant))) as img:
+        return np.asarray(img)
+
+
+@pytest.mark.parametrize("filter_name", list(FILTERS))
+@pytest.mark.parametrize("variant", [x for x in VARIANTS if x != "text" and x != "ztxt"])
+def test_probe_matches_reference_for_every_filter(filter_name, variant):
+    pixels = stealth_pixels((61, 150), variant)
+    data = encode_png(pixels, FILTERS[filter_name])
+    with Image.open(BytesIO(data)) as img:
+        assert np.array_equal(np.asarray(img), pixels)
+        expected = read_info_from_image_stealth_reference(img)
+
+    assert np.array_equal(png_column_zero(data, STEALTH_SIG_BITS), pixels[:STEALTH_SIG_BITS, 0])
+    assert probe_stealth_signature(data) is (expected is not None)
+
+
+@pytest.mark.parametrize("filter_name", list(FILTERS))
+def test_short_images_fall_back_to_rgb(filter_name):
+    # too short for the 120-row alpha signature, the 40-row RGB one still fits
+    filter_type = FILTERS[filter_name]
+    assert probe_stealth_signature(encode_png(stealth_pixels((64, 64), "stealth-rgb"), filter_type)) is True
+    assert probe_stealth_signature(encode_png(make_pixels((64, 64), 3), filter_type)) is False
+    # RGBA without an RGB signature might still have an alpha one, only a full decode can tell
+    assert probe_stealth_signature(encode_png(make_pixels((64, 64), 4), filter_type)) is None
+    assert probe_stealth_signature(encode_png(stealth_pixels((64, 64), "stealth-alpha"), filter_type)) is None
+
+
+def test_probe_gives_up_on_what_it_cannot_read():
+    data = encode_png(stealth_pixels((61, 150), "stealth-alpha"), FILTERS["paeth"])
+    # cut off before enough rows have arrived
+    assert probe_stealth_signature(data[:200]) is None
+    assert probe_stealth_signature(b"GIF89a" + data[6:]) is None
+    # grayscale can't carry stealth data at all
+    gray = Image.new("L", (8, 8))
+    buf = BytesIO()
+    gray.save(buf, format="PNG")
+    assert probe_stealth_signature(buf.getvalue()) is False